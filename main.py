@@ -8,10 +8,11 @@ import sys
 import time
 import os
 import atexit
+import fcntl
 from pathlib import Path
 import json
+import signal
 import threading
-import queue
 import traceback
 
 # Add src to path
@@ -19,7 +20,8 @@ sys.path.insert(0, str(Path(__file__).parent / "src"))
 
 from key_listener import KeyListener
 from audio_capture import AudioCapture
-from asr import ASREngine
+from ring_buffer import SPSCRing
+from asr import ASRProcess
 from injector import TextInjector
 from src.event_logger import EventLogger
 from src.command_router import CommandRouter
@@ -31,39 +33,48 @@ from src.task_parser import TaskParser
 from src.context_manager import ContextManager
 from src.event_logger import EventLogger
 from src.screen_monitor import ScreenMonitor
-from src.web_server import web_server
+from src.web_server import get_web_server
 
 # Lock file to prevent multiple instances
 LOCK_FILE = Path("/tmp/dados.lock")
+_lock_fd = None
 
 def create_lock():
-    """Create lock file to prevent multiple instances"""
-    if LOCK_FILE.exists():
+    """Take an exclusive flock on the lock file to prevent multiple instances"""
+    global _lock_fd
+    fd = os.open(str(LOCK_FILE), os.O_CREAT | os.O_RDWR, 0o644)
+    try:
+        # The kernel arbitrates exclusivity atomically and drops the lock if we die
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
         try:
-            with open(LOCK_FILE, 'r') as f:
-                pid = int(f.read().strip())
-            # Check if process is still running
-            os.kill(pid, 0)  # This will raise OSError if process doesn't exist
-            print("❌ Another instance of Dados is already running!")
-            print(f"   PID: {pid}")
-            print("   Kill it first with: pkill -f 'python.*main.py'")
-            return False
-        except (OSError, ValueError):
-            # Process is dead, remove stale lock file
-            LOCK_FILE.unlink()
+            pid = os.read(fd, 32).decode().strip() or "unknown"
+        except OSError:
+            pid = "unknown"
+        os.close(fd)
+        print("❌ Another instance of Dados is already running!")
+        print(f"   PID: {pid}")
+        print("   Kill it first with: pkill -f 'python.*main.py'")
+        return False
     
-    # Create new lock file
-    with open(LOCK_FILE, 'w') as f:
-        f.write(str(os.getpid()))
+    # PID is informational only; the flock is what enforces single-instance
+    os.ftruncate(fd, 0)
+    os.write(fd, str(os.getpid()).encode())
+    _lock_fd = fd
     
     # Register cleanup function
     atexit.register(cleanup_lock)
     return True
 
 def cleanup_lock():
-    """Remove lock file on exit"""
-    if LOCK_FILE.exists():
-        LOCK_FILE.unlink()
+    """Release the lock on exit"""
+    global _lock_fd
+    if _lock_fd is None:
+        return
+    # The file stays: unlinking it would let a waiter lock the old inode while a new
+    # instance locks a fresh file, and both would run
+    os.close(_lock_fd)
+    _lock_fd = None
 
 def main():
     # Check for existing instance
@@ -74,7 +85,7 @@ def main():
     
     # Initialize components
     audio = AudioCapture()
-    asr = ASREngine()
+    asr = ASRProcess()  # Whisper runs in its own process
     injector = TextInjector()
 
     # Load command library (deterministic commands)
@@ -92,7 +103,7 @@ def main():
     lfm = None
     vlm = None
     try:
-        lfm = LFMClient()  # unsloth/LFM2-1.2B-GGUF, F16 by default
+        lfm = LFMClient()  # unsloth/LFM2-1.2B-GGUF, Q4_K_M by default
         print("LFM2 language model ready")
     except Exception as e:
         print(f"[warn] LFM init failed: {e}. Falling back to dictation-only for commands.")
@@ -105,33 +116,53 @@ def main():
 
     # Executors, router, and context manager
     event_logger = EventLogger()
+
+    def on_sigterm(signum, frame):
+        # launchctl unload sends SIGTERM, which skips atexit; write buffered events
+        # now, then shut down the same way as Ctrl-C
+        event_logger.close()
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, on_sigterm)
     screen_monitor = ScreenMonitor(interval=1.0)  # Screenshot every second
     router = CommandRouter(lfm_client=lfm, command_library=command_library)
     shell_exec = ShellExecutor()
     gui_exec = GUIExecutor(screen_monitor=screen_monitor)
     task_parser = TaskParser()
     context_mgr = ContextManager()
+    web_server = get_web_server()
 
-    # Background processing queue
-    task_queue: "queue.Queue" = queue.Queue()
+    # Background processing ring (key listener -> ASR); never blocks the listener
+    audio_ring = SPSCRing(capacity=8)
 
-    def worker():
+    def asr_feeder():
+        """Stage A: forward recordings to the ASR process"""
         while True:
-            item = task_queue.get()
+            item = audio_ring.get()
             if item is None:
+                asr.stop()
                 break
-            started_at = time.time()
-            audio_data = item.get("audio")
+            asr.submit(item["audio"], started_at=item["started_at"])
+
+    def worker():
+        """Stage B: route and execute transcripts while the next clip is decoding"""
+        while True:
+            try:
+                item = asr.get_result()
+            except RuntimeError as e:
+                print(f"❌ {e}; speech recognition stopped")
+                return
+            started_at = item.get("started_at") or time.time()
             try:
-                raw_text = asr.transcribe(audio_data)
+                raw_text = item.get("text") or ""
                 if not raw_text.strip():
                     print("No speech detected")
                     continue
                 
-                # Optional grammar correction
+                # Optional grammar correction; skipped for plain dictation (no command triggers)
                 corrected_text = raw_text
                 try:
-                    if lfm:
+                    if lfm and router.probable_path(raw_text) != "dictation":
                         corrected_text = lfm.correct_text(raw_text)
                 except Exception:
                     corrected_text = raw_text
@@ -186,7 +217,8 @@ def main():
                             cmd_summary += f" and {len(results)-3} more"
                         web_server.add_action_entry("Shell Command", cmd_summary, success=ok)
                     elif path == "gui" and vlm:
-                        gui_res = gui_exec.execute(instruction=task.instruction, vlm_client=vlm)
+                        gui_res = gui_exec.execute(instruction=task.instruction, vlm_client=vlm,
+                                                   record_prev_pos=True)  # logged below
                         success = success and bool(gui_res.get("success"))
                         if gui_res.get("error"):
                             err = gui_res.get("error", "")
@@ -261,9 +293,9 @@ def main():
             except Exception as e:
                 print(f"Processing error: {e}")
                 traceback.print_exc()
-            finally:
-                task_queue.task_done()
 
+    feeder = threading.Thread(target=asr_feeder, daemon=True)
+    feeder.start()
     threading.Thread(target=worker, daemon=True).start()
     
     def start_dictation():
@@ -274,8 +306,10 @@ def main():
         print("Processing...")
         audio_data = audio.stop()
         # enqueue processing to avoid blocking the key listener
-        task_queue.put({"audio": audio_data})
-        print("Enqueued speech for processing")
+        if audio_ring.put({"audio": audio_data, "started_at": time.time()}):
+            print("Enqueued speech for processing")
+        else:
+            print("[warn] Processing backlog full, dropped recording")
     
     # Start key listener for Right Option key
     listener = KeyListener(
@@ -300,6 +334,12 @@ def main():
     except KeyboardInterrupt:
         print("\nGoodbye!")
         listener.stop()
+        # The listener is stopped, so this thread is now the ring's only producer;
+        # the sentinel lets the feeder shut the ASR process down after pending clips
+        if audio_ring.put(None):
+            feeder.join(timeout=5)
+        else:
+            asr.stop()
         return 0
 
 
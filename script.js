@@ -58,6 +58,9 @@ document.addEventListener('DOMContentLoaded', function() {
             case 'action':
                 addActionEntry(message.data);
                 break;
+            case 'batch':
+                message.events.forEach(handleWebSocketMessage);
+                break;
         }
     }
     
@@ -1,31 +1,81 @@
 """
 Speech recognition using Whisper
+Prefers faster-whisper (CTranslate2, int8 on CPU); falls back to openai-whisper.
 """
 
-import whisper
+try:
+    from faster_whisper import WhisperModel
+    import ctranslate2
+except Exception:  # pragma: no cover
+    WhisperModel = None
+    ctranslate2 = None
+try:
+    import whisper
+except Exception:  # pragma: no cover
+    whisper = None
 try:
     import torch  # optional; whisper depends on it but guard just in case
 except Exception:  # pragma: no cover
     torch = None
+import multiprocessing as mp
 import numpy as np
+import os
+import queue
+import time
 from pathlib import Path
 from data_logger import DataLogger
 
 
+# Scale factor mapping int16 PCM samples onto [-1, 1]
+_PCM16_SCALE = np.float32(1.0 / 32768.0)
+
+# English-only model; transcribe always forces language="en"
+DEFAULT_MODEL_SIZE = "tiny.en"
+
+# Clips quieter or shorter than this are treated as accidental key taps
+SILENCE_RMS = 0.005
+MIN_SPEECH_SECONDS = 0.3
+
+# How often ASRProcess checks that the child is still alive while waiting on it
+_POLL_SECONDS = 1.0
+
+
 class ASREngine:
-    def __init__(self, model_size="base", enable_logging=True):
+    def __init__(self, model_size=None, enable_logging=True):
         """
         Initialize Whisper model
-        Model sizes: tiny, base, small, medium, large
-        base = good balance of speed/accuracy
+        Model sizes: tiny, base, small, medium, large (".en" variants are English-only)
+        tiny.en = default; short English commands, LFM correction covers the accuracy gap
+        Override with the DADOS_WHISPER_MODEL environment variable.
         """
+        model_size = model_size or os.environ.get("DADOS_WHISPER_MODEL", DEFAULT_MODEL_SIZE)
         try:
             print(f"Loading Whisper model ({model_size})...")
-            self.model = whisper.load_model(model_size)
             self.sample_rate = 16000
-            # Use FP16 only if CUDA is available to avoid CPU warning
-            self._use_fp16 = bool(getattr(torch, "cuda", None) and torch.cuda.is_available())
-            print(f"Loaded Whisper model ({model_size})")
+            # Leave headroom for the key listener / worker threads
+            cpu_threads = max(1, (os.cpu_count() or 2) // 2)
+            if WhisperModel is not None:
+                self._backend = "faster-whisper"
+                # int8 GEMM kernels on CPU, fp16 on CUDA
+                use_cuda = ctranslate2.get_cuda_device_count() > 0
+                self._use_fp16 = use_cuda
+                self.model = WhisperModel(
+                    model_size,
+                    device="auto",
+                    compute_type="float16" if use_cuda else "int8",
+                    cpu_threads=cpu_threads,
+                )
+            elif whisper is not None:
+                self._backend = "whisper"
+                self.model = whisper.load_model(model_size)
+                # Use FP16 only if CUDA is available to avoid CPU warning
+                self._use_fp16 = bool(getattr(torch, "cuda", None) and torch.cuda.is_available())
+                if torch is not None and not self._use_fp16:
+                    torch.set_num_threads(cpu_threads)
+            else:
+                raise RuntimeError("neither faster-whisper nor openai-whisper is installed")
+            print(f"Loaded Whisper model ({model_size}, {self._backend})")
+            self._warmup()
             
             # Initialize data logger (legacy; may be replaced by Dados event logger)
             self.logger = DataLogger() if enable_logging else None
@@ -36,22 +86,67 @@ class ASREngine:
             print(f"Could not load Whisper model: {e}")
             raise
     
+    def _warmup(self):
+        """Run one dummy decode so the first real command doesn't pay kernel setup costs.
+        _decode applies no VAD (silence is gated in transcribe), so the zeros reach the
+        encoder and decoder; _decode joins the lazy segments, which drives the pass."""
+        try:
+            self._decode(np.zeros(self.sample_rate, dtype=np.float32))
+        except Exception:
+            pass
+    
+    def _decode(self, audio_np):
+        """Run the loaded backend on float32 PCM and return the stripped transcript"""
+        # Short commands: single greedy pass, no temperature fallback, no timestamps
+        if self._backend == "faster-whisper":
+            # Segments are lazy; joining them drives the decode
+            segments, _ = self.model.transcribe(
+                audio_np,
+                language="en",
+                beam_size=1,
+                best_of=1,
+                temperature=0.0,
+                condition_on_previous_text=False,
+                without_timestamps=True,
+                no_speech_threshold=0.6,
+            )
+            return " ".join(seg.text.strip() for seg in segments).strip()
+        # openai-whisper is greedy when beam_size/best_of are unset (it rejects best_of at T=0)
+        result = self.model.transcribe(
+            audio_np,
+            language="en",
+            fp16=self._use_fp16,
+            temperature=0.0,
+            condition_on_previous_text=False,
+            without_timestamps=True,
+            no_speech_threshold=0.6,
+        )
+        return result["text"].strip()
+    
     def transcribe(self, audio_data):
-        """Convert audio data to text using Whisper"""
-        if not audio_data:
+        """
+        Convert audio data to text using Whisper
+        audio_data: int16 PCM as bytes, any buffer (bytearray, memoryview) or ndarray;
+        float32 ndarrays already in [-1, 1] are used as-is.
+        """
+        if audio_data is None or len(audio_data) == 0:
             return ""
         
         try:
-            # Convert audio bytes to numpy array
+            # Convert audio to a float32 numpy array (no copy of the source buffer)
             audio_np = self._bytes_to_numpy(audio_data)
             
+            # Skip the decoder entirely on silence / too-short clips
+            if self._is_silence(audio_np):
+                return ""
+            
             # Transcribe with Whisper
-            result = self.model.transcribe(audio_np, language="en", fp16=self._use_fp16)
-            text = result["text"].strip()
+            text = self._decode(audio_np)
             
             # Log the audio and transcription (optional)
             if self.logger and text:
-                self.logger.save_transcription(audio_data, text, self.sample_rate)
+                pcm = audio_data if isinstance(audio_data, bytes) else self._to_int16(audio_data).tobytes()
+                self.logger.save_transcription(pcm, text, self.sample_rate)
             
             return text
             
@@ -59,12 +154,110 @@ class ASREngine:
             print(f"❌ Transcription error: {e}")
             return ""
     
+    def _is_silence(self, audio_np):
+        """Cheap energy gate run before the Whisper forward pass"""
+        n = len(audio_np)
+        if n < MIN_SPEECH_SECONDS * self.sample_rate:
+            return True
+        rms = float(np.sqrt(np.dot(audio_np, audio_np) / n))
+        return rms < SILENCE_RMS
+    
+    @staticmethod
+    def _to_int16(audio_data):
+        """
+        int16 PCM from bytes, a buffer, or an int16 ndarray (zero-copy views), or
+        from a float32 ndarray in [-1, 1] (clipped and scaled). Other dtypes raise.
+        """
+        if isinstance(audio_data, np.ndarray):
+            if audio_data.dtype == np.int16:
+                return audio_data.ravel()
+            if audio_data.dtype == np.float32:
+                scaled = np.clip(audio_data.ravel(), -1.0, 1.0) * 32767.0
+                return scaled.astype(np.int16)
+            raise TypeError(f"unsupported audio dtype {audio_data.dtype}; expected int16 or float32")
+        return np.frombuffer(audio_data, dtype=np.int16)
+    
     def _bytes_to_numpy(self, audio_data):
         """Convert audio bytes to numpy array for Whisper"""
-        # Convert bytes to numpy array
-        audio_np = np.frombuffer(audio_data, dtype=np.int16)
+        if isinstance(audio_data, np.ndarray) and audio_data.dtype == np.float32:
+            return audio_data.ravel()
+        audio_i16 = self._to_int16(audio_data)
         
-        # Convert to float32 and normalize to [-1, 1]
-        audio_np = audio_np.astype(np.float32) / 32768.0
-        
-        return audio_np 
\ No newline at end of file
+        # Cast to float32 and normalize to [-1, 1] in a single pass
+        return np.multiply(audio_i16, _PCM16_SCALE, dtype=np.float32)
+
+
+def _asr_loop(in_q, out_q, model_size, enable_logging):
+    """Child-process entry point: load Whisper once, then transcribe jobs until None"""
+    try:
+        engine = ASREngine(model_size=model_size, enable_logging=enable_logging)
+    except Exception as e:
+        out_q.put({"error": str(e)})
+        return
+    out_q.put({"ready": True})
+    while True:
+        job = in_q.get()
+        if job is None:
+            break
+        audio_data = job.pop("audio", None)
+        job["text"] = engine.transcribe(audio_data)
+        out_q.put(job)
+
+
+class ASRProcess:
+    """
+    Runs ASREngine in a dedicated process so the Whisper forward pass doesn't
+    contend for the GIL with the key listener, screen monitor and router.
+    Jobs are dicts with an "audio" key; results echo the other keys plus "text".
+    """
+
+    def __init__(self, model_size=None, enable_logging=True):
+        ctx = mp.get_context("spawn")
+        self._in = ctx.Queue()
+        self._out = ctx.Queue()
+        self._proc = ctx.Process(
+            target=_asr_loop,
+            args=(self._in, self._out, model_size, enable_logging),
+            daemon=True,
+        )
+        self._proc.start()
+        # Surface model load failures at startup, like ASREngine does
+        status = self._get()
+        if status.get("error"):
+            self._proc.join(timeout=2)
+            raise RuntimeError(f"Could not load Whisper model: {status['error']}")
+    
+    def submit(self, audio_data, **meta):
+        """Queue audio for transcription without waiting for the result"""
+        self._in.put({"audio": audio_data, **meta})
+    
+    def get_result(self, timeout=None):
+        """Next finished job dict (raises queue.Empty on timeout, RuntimeError if the
+        ASR process has died)"""
+        return self._get(timeout)
+    
+    def _get(self, timeout=None):
+        """Read from the child, checking between polls that it is still running, so a
+        crash (OOM, segfault in ctranslate2) raises instead of blocking forever"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = _POLL_SECONDS
+            if deadline is not None:
+                wait = max(0.0, min(wait, deadline - time.monotonic()))
+            try:
+                return self._out.get(timeout=wait)
+            except queue.Empty:
+                if not self._proc.is_alive():
+                    # Anything the child put just before exiting is already flushed
+                    try:
+                        return self._out.get(timeout=0.1)
+                    except queue.Empty:
+                        raise RuntimeError(
+                            f"ASR process exited unexpectedly (exit code {self._proc.exitcode})"
+                        ) from None
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise
+    
+    def stop(self):
+        self._in.put(None)
+        self._proc.join(timeout=2)
@@ -8,17 +8,19 @@ import io
 
 
 class AudioCapture:
-    def __init__(self, sample_rate=16000, channels=1, chunk=1024):
+    def __init__(self, sample_rate=16000, channels=1, chunk=1024, max_seconds=30):
         self.sample_rate = sample_rate
         self.channels = channels
         self.chunk = chunk
         self.audio = pyaudio.PyAudio()
         self.stream = None
-        self.frames = []
+        # Preallocated int16 PCM buffer reused across recordings (grows if a clip runs long)
+        self._buf = bytearray(sample_rate * channels * 2 * max_seconds)
+        self._len = 0
     
     def start(self):
         """Start recording audio"""
-        self.frames = []
+        self._len = 0
         self.stream = self.audio.open(
             format=pyaudio.paInt16,
             channels=self.channels,
@@ -35,13 +37,18 @@ class AudioCapture:
             self.stream.stop_stream()
             self.stream.close()
         
-        # Convert frames to bytes
-        audio_data = b''.join(self.frames)
+        # Copy the recorded region out so the buffer can be reused immediately
+        audio_data = bytes(memoryview(self._buf)[:self._len])
         return audio_data
     
     def _callback(self, in_data, frame_count, time_info, status):
         """Audio stream callback"""
-        self.frames.append(in_data)
+        end = self._len + len(in_data)
+        if end > len(self._buf):
+            # Grow geometrically so long recordings stay amortized O(1) per frame
+            self._buf.extend(bytes(max(end - len(self._buf), len(self._buf))))
+        self._buf[self._len:end] = in_data
+        self._len = end
         return (in_data, pyaudio.paContinue)
     
     def __del__(self):
@@ -9,12 +9,39 @@ Paths:
 """
 from __future__ import annotations
 
-from typing import Any, Dict, List
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+import atexit
+import hashlib
+import json
+import os
+import pickle
 import shlex
+import threading
+import time
+
+import numpy as np
+
+try:
+    import ahocorasick  # optional: pyahocorasick C automaton for one-pass keyword scans
+except Exception:  # pragma: no cover
+    ahocorasick = None
 
 
 class CommandRouter:
-    def __init__(self, *, lfm_client: Any, command_library: Dict[str, Any]) -> None:
+    def __init__(
+        self,
+        *,
+        lfm_client: Any,
+        command_library: Dict[str, Any],
+        cache_size: int = 512,
+        embed_fn: Optional[Callable[[str], Sequence[float]]] = None,
+        semantic_threshold: float = 0.92,
+        semantic_size: int = 256,
+        cache_path: Optional[str | Path] = "data/cache/router_cache.pkl",
+        save_interval_s: float = 10.0,
+    ) -> None:
         self.lfm = lfm_client
         self.command_library = command_library
         # Simple heuristic for GUI tasks; can be expanded or replaced by LFM intent parsing
@@ -22,21 +49,110 @@ class CommandRouter:
             "click", "press", "compose", "scroll", "select", "button",
             "menu", "tab", "play", "pause", "submit", "open compose",
         }
+        # Lowercased / pre-tokenized library entries, built once; keyword hits map back by index
+        # aliases: (alias, alias words, url); apps: (key, tokens); workflows: (key words, commands)
+        self._aliases_lc = [
+            (alias.lower(), tuple(alias.lower().split("_")), url)
+            for alias, url in self.command_library.get("aliases", {}).items()
+        ]
+        self._apps_lc = [
+            (app_key.lower(), self._tokenize_app(cmd))
+            for app_key, cmd in self.command_library.get("apps", {}).items()
+        ]
+        self._workflows_lc = [
+            (tuple(workflow_key.lower().replace("_", " ").split()), commands)
+            for workflow_key, commands in self.command_library.get("workflows", {}).items()
+        ]
+        # keyword -> [(category, entry index)]; scanned once per instruction
+        self._kw_index = self._index_keywords()
+        self._ac = self._build_automaton(self._kw_index)
+        # LFM result caches: exact LRU on the normalized instruction, plus an optional
+        # semantic layer (e.g. embed_fn=SentenceTransformer("all-MiniLM-L6-v2").encode)
+        self._cache_lock = threading.Lock()
+        self._cache_size = cache_size
+        self._exact_cache: "OrderedDict[str, List[List[str]]]" = OrderedDict()
+        self._embed_fn = embed_fn
+        self._semantic_threshold = semantic_threshold
+        self._semantic_size = semantic_size
+        self._sem_keys: List[str] = []
+        self._sem_cmds: List[List[List[str]]] = []
+        self._sem_matrix: Optional[np.ndarray] = None  # unit-norm rows, one per key
+        # Disk persistence so warm routes survive restarts; writes are debounced
+        self._cache_path = Path(cache_path) if cache_path else None
+        self._save_interval_s = save_interval_s
+        self._cache_dirty = False
+        self._saver: Optional[threading.Thread] = None
+        self._library_digest = hashlib.blake2b(
+            json.dumps(command_library, sort_keys=True, default=str).encode("utf-8"), digest_size=16
+        ).hexdigest()
+        self._load_cache()
+
+    @staticmethod
+    def _tokenize_app(cmd: Any) -> Any:
+        """Support either a shell string or a pre-tokenized list"""
+        if isinstance(cmd, list):
+            return cmd
+        try:
+            return shlex.split(str(cmd))
+        except ValueError:
+            # Malformed entry: keep the raw string so the error surfaces when it is used
+            return str(cmd)
+
+    def _index_keywords(self) -> Dict[str, List[Tuple[str, int]]]:
+        """Map every lowercased trigger substring to the library entries it can select"""
+        index: Dict[str, List[Tuple[str, int]]] = {}
+
+        def add(keyword: str, target: Tuple[str, int]) -> None:
+            if keyword:
+                index.setdefault(keyword, []).append(target)
+
+        for i, (alias_lc, alias_words, _) in enumerate(self._aliases_lc):
+            add(alias_lc, ("alias", i))
+            for word in alias_words:
+                add(word, ("alias", i))
+        for i, (app_lc, _) in enumerate(self._apps_lc):
+            add(app_lc, ("app", i))
+        for i, (key_words, _) in enumerate(self._workflows_lc):
+            for word in set(key_words):
+                add(word, ("workflow", i))
+        for keyword in self.gui_keywords:
+            add(keyword, ("gui", 0))
+        return index
+
+    @staticmethod
+    def _build_automaton(index: Dict[str, Any]) -> Any:
+        if ahocorasick is None or not index:
+            return None
+        automaton = ahocorasick.Automaton()
+        for keyword in index:
+            automaton.add_word(keyword, keyword)
+        automaton.make_automaton()
+        return automaton
+
+    def _scan(self, low: str) -> Set[str]:
+        """Return every indexed keyword occurring as a substring of low"""
+        if self._ac is not None:
+            return {keyword for _, keyword in self._ac.iter(low)}
+        return {keyword for keyword in self._kw_index if keyword in low}
 
     def route(self, instruction: str) -> Dict[str, Any]:
         text = instruction.strip()
-        low = text.lower()
+        hits = self._scan(text.lower())
 
         # 1) Path A: True deterministic matching (direct JSON lookup)
-        deterministic_match = self._try_deterministic_match(text)
+        deterministic_match = self._try_deterministic_match(text, hits)
         if deterministic_match:
             return deterministic_match
 
         # 2) Heuristic: UI verbs => GUI path
-        if any(k in low for k in self.gui_keywords):
+        if any(k in hits for k in self.gui_keywords):
             return {"path": "gui"}
 
         # 3) Path B: Ask LFM to generate shell commands using the command library as context
+        key = " ".join(text.lower().split())
+        cached = self._cache_get(key)
+        if cached:
+            return {"path": "shell", "commands": cached}
         try:
             commands = self.lfm.generate_commands(
                 instruction=text,
@@ -52,31 +168,172 @@ class CommandRouter:
             commands = []
 
         if commands:
+            self._cache_put(key, commands)
             return {"path": "shell", "commands": commands}
 
         # 4) Fallback to dictation (Path D)
         return {"path": "dictation"}
 
-    def _try_deterministic_match(self, text: str) -> Dict[str, Any] | None:
+    def _embed(self, text: str) -> Optional[np.ndarray]:
+        if self._embed_fn is None:
+            return None
+        try:
+            vec = np.asarray(self._embed_fn(text), dtype=np.float32).ravel()
+        except Exception:
+            return None
+        norm = float(np.linalg.norm(vec))
+        return vec / norm if norm else None
+
+    def _cache_get(self, key: str) -> Optional[List[List[str]]]:
+        """Look up cached LFM commands: exact match first, then nearest embedding"""
+        with self._cache_lock:
+            hit = self._exact_cache.get(key)
+            if hit is not None:
+                self._exact_cache.move_to_end(key)
+                return [list(c) for c in hit]
+            if self._sem_matrix is None:
+                return None
+        q = self._embed(key)
+        if q is None:
+            return None
+        with self._cache_lock:
+            if self._sem_matrix is None or self._sem_matrix.shape[1] != q.shape[0]:
+                return None
+            sims = self._sem_matrix @ q
+            best = int(sims.argmax())
+            if float(sims[best]) < self._semantic_threshold:
+                return None
+            return [list(c) for c in self._sem_cmds[best]]
+
+    def _cache_put(self, key: str, commands: List[List[str]]) -> None:
+        with self._cache_lock:
+            self._exact_cache[key] = commands
+            self._exact_cache.move_to_end(key)
+            while len(self._exact_cache) > self._cache_size:
+                self._exact_cache.popitem(last=False)
+            self._cache_dirty = True
+        self._ensure_saver()
+        q = self._embed(key)
+        if q is None:
+            return
+        with self._cache_lock:
+            if self._sem_matrix is not None and self._sem_matrix.shape[1] != q.shape[0]:
+                return
+            self._sem_keys.append(key)
+            self._sem_cmds.append(commands)
+            row = q[None, :]
+            self._sem_matrix = row if self._sem_matrix is None else np.vstack([self._sem_matrix, row])
+            # Drop the oldest entries beyond capacity
+            excess = len(self._sem_keys) - self._semantic_size
+            if excess > 0:
+                del self._sem_keys[:excess]
+                del self._sem_cmds[:excess]
+                self._sem_matrix = self._sem_matrix[excess:]
+
+    def _load_cache(self) -> None:
+        """Restore caches written by a previous process for the same command library"""
+        if not self._cache_path or not self._cache_path.exists():
+            return
+        try:
+            with open(self._cache_path, "rb") as f:
+                state = pickle.load(f)
+            if state.get("version") != 1 or state.get("library") != self._library_digest:
+                return
+            exact = state.get("exact", [])[-self._cache_size:]
+            self._exact_cache = OrderedDict(exact)
+            matrix = state.get("sem_matrix")
+            if matrix is not None and len(state.get("sem_keys", [])) == len(matrix):
+                self._sem_keys = list(state["sem_keys"])
+                self._sem_cmds = list(state["sem_cmds"])
+                self._sem_matrix = np.asarray(matrix, dtype=np.float32)
+        except Exception as e:
+            print(f"[warn] Router cache load failed: {e}")
+
+    def save_cache(self) -> None:
+        """Write caches to disk atomically if they changed since the last save"""
+        if not self._cache_path:
+            return
+        with self._cache_lock:
+            if not self._cache_dirty:
+                return
+            state = {
+                "version": 1,
+                "library": self._library_digest,
+                "exact": list(self._exact_cache.items()),
+                "sem_keys": list(self._sem_keys),
+                "sem_cmds": list(self._sem_cmds),
+                "sem_matrix": self._sem_matrix,
+            }
+            self._cache_dirty = False
+        try:
+            self._cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self._cache_path.with_suffix(self._cache_path.suffix + ".tmp")
+            with open(tmp, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._cache_path)
+        except Exception as e:
+            print(f"[warn] Router cache save failed: {e}")
+
+    def _ensure_saver(self) -> None:
+        """Start the background saver on first cache write"""
+        if not self._cache_path or self._saver is not None:
+            return
+        with self._cache_lock:
+            if self._saver is not None:
+                return
+
+            def run() -> None:
+                while True:
+                    time.sleep(self._save_interval_s)
+                    self.save_cache()
+
+            self._saver = threading.Thread(target=run, daemon=True)
+            self._saver.start()
+        atexit.register(self.save_cache)
+
+    def probable_path(self, instruction: str) -> str:
+        """
+        Cheap routing hint from the keyword index alone (never calls the LFM).
+        "dictation" means no library trigger or GUI verb occurs in the text.
+        """
+        text = instruction.strip()
+        hits = self._scan(text.lower())
+        if not hits:
+            return "dictation"
+        if self._try_deterministic_match(text, hits):
+            return "shell"
+        if any(k in hits for k in self.gui_keywords):
+            return "gui"
+        return "shell"
+
+    def _try_deterministic_match(self, text: str, hits: Set[str] | None = None) -> Dict[str, Any] | None:
         """Path A: Direct deterministic matching without LFM"""
-        low = text.lower().strip()
+        if hits is None:
+            hits = self._scan(text.lower().strip())
+
+        # Collect candidate entries per category; library order decides ties
+        candidates: Dict[str, Set[int]] = {"alias": set(), "app": set(), "workflow": set()}
+        for keyword in hits:
+            for category, i in self._kw_index[keyword]:
+                if category in candidates:
+                    candidates[category].add(i)
         
         # Check aliases
-        for alias, url in self.command_library.get("aliases", {}).items():
-            if alias.lower() in low or any(word in low for word in alias.lower().split("_")):
-                return {"path": "shell", "commands": [["open", url]]}
+        if candidates["alias"]:
+            _, _, url = self._aliases_lc[min(candidates["alias"])]
+            return {"path": "shell", "commands": [["open", url]]}
         
         # Check apps
-        for app_key, cmd in self.command_library.get("apps", {}).items():
-            if app_key.lower() in low:
-                # Support either a shell string or a pre-tokenized list
-                tokens = cmd if isinstance(cmd, list) else shlex.split(str(cmd))
-                return {"path": "shell", "commands": [tokens]}
+        if candidates["app"]:
+            _, tokens = self._apps_lc[min(candidates["app"])]
+            if isinstance(tokens, str):
+                tokens = shlex.split(tokens)
+            return {"path": "shell", "commands": [list(tokens)]}
         
-        # Check workflows
-        for workflow_key, commands in self.command_library.get("workflows", {}).items():
-            key_words = workflow_key.lower().replace("_", " ").split()
-            if any(word in low for word in key_words) and len([w for w in key_words if w in low]) >= len(key_words) // 2:
+        # Check workflows: at least half of the key words must be present
+        for i in sorted(candidates["workflow"]):
+            key_words, commands = self._workflows_lc[i]
+            if len([w for w in key_words if w in hits]) >= len(key_words) // 2:
                 return {"path": "shell", "commands": commands}
         
         return None
@@ -0,0 +1,39 @@
+"""
+Non-blocking console logging for background loops.
+
+Records are put on a queue by the calling thread and written to stdout by a
+listener thread, so the screen monitor and web server never wait on terminal or
+pipe I/O. Output is the bare message, same as the print() calls it replaces.
+"""
+from __future__ import annotations
+
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+
+_ROOT = "dados"
+
+
+def _setup() -> None:
+    root = logging.getLogger(_ROOT)
+    if root.handlers:
+        return
+    q: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(logging.Formatter("%(message)s"))
+    listener = logging.handlers.QueueListener(q, stream)
+    listener.start()
+    # Flushes whatever is still queued at exit
+    atexit.register(listener.stop)
+
+    root.addHandler(logging.handlers.QueueHandler(q))
+    root.setLevel(logging.INFO)
+    root.propagate = False
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger under the shared queued 'dados' handler"""
+    _setup()
+    return logging.getLogger(f"{_ROOT}.{name}")
@@ -7,10 +7,10 @@ from __future__ import annotations
 import asyncio
 import threading
 import time
-from typing import Dict, List, Any, Optional, Callable
+from typing import Dict, List, Any, Optional, Tuple
 from dataclasses import dataclass
 from enum import Enum
-from concurrent.futures import ThreadPoolExecutor, Future
+from concurrent.futures import ThreadPoolExecutor
 
 from task_parser import Task, TaskType
 
@@ -34,6 +34,8 @@ class TaskExecution:
 
 class ContextManager:
     def __init__(self, max_parallel_tasks: int = 3) -> None:
+        # Runs routing and the blocking dictation/GUI work; shell commands are asyncio
+        # subprocesses on the orchestrating loop and never take a worker
         self.executor = ThreadPoolExecutor(max_workers=max_parallel_tasks)
         self.gui_lock = threading.Lock()  # Serialize GUI interactions
         self.executions: Dict[str, TaskExecution] = {}
@@ -47,77 +49,105 @@ class ContextManager:
         command_router: Any,
         vlm_client: Any
     ) -> Dict[str, TaskExecution]:
-        """Execute task graph with proper dependencies and concurrency"""
-        
-        # Initialize task executions
+        """
+        Execute task graph with proper dependencies and concurrency.
+        Runs execute_tasks_async on a fresh event loop, so it must not be called
+        from a thread that already has a running loop.
+        """
+        return asyncio.run(self.execute_tasks_async(
+            tasks, shell_executor, gui_executor, text_injector, command_router, vlm_client
+        ))
+
+    async def execute_tasks_async(
+        self,
+        tasks: List[Task],
+        shell_executor: Any,
+        gui_executor: Any,
+        text_injector: Any,
+        command_router: Any,
+        vlm_client: Any,
+        task_timeout: float = 300,
+    ) -> Dict[str, TaskExecution]:
+        """
+        Every task is a coroutine awaiting its dependencies. A task that exceeds
+        task_timeout is marked failed; its shell processes are killed, but dictation or
+        GUI work already handed to a worker thread runs to completion (holding the GUI
+        lock until it does).
+        """
+        done: Dict[str, asyncio.Event] = {}
         for task in tasks:
             self.executions[task.id] = TaskExecution(task=task, status=TaskStatus.PENDING)
-        
-        # Submit tasks respecting dependencies
-        futures: Dict[str, Future] = {}
-        
-        for task in tasks:
-            # Wait for dependencies
-            self._wait_for_dependencies(task)
-            
-            # Submit task for execution
-            future = self.executor.submit(
-                self._execute_single_task,
-                task,
-                shell_executor,
-                gui_executor,
-                text_injector,
-                command_router,
-                vlm_client
-            )
-            futures[task.id] = future
-        
-        # Wait for all tasks to complete
-        for task_id, future in futures.items():
+            done[task.id] = asyncio.Event()
+
+        async def run(task: Task) -> None:
+            execution = self.executions[task.id]
             try:
-                result = future.result(timeout=300)  # 5 minute timeout per task
-                self.executions[task_id].result = result
-                self.executions[task_id].status = TaskStatus.COMPLETED
+                for dep_id in task.depends_on:
+                    if dep_id in done:
+                        await done[dep_id].wait()
+                execution.result = await asyncio.wait_for(
+                    self._execute_single_task_async(
+                        task, shell_executor, gui_executor, text_injector,
+                        command_router, vlm_client,
+                    ),
+                    timeout=task_timeout,
+                )
+                execution.status = TaskStatus.COMPLETED
             except Exception as e:
-                self.executions[task_id].error = str(e)
-                self.executions[task_id].status = TaskStatus.FAILED
-        
-        return self.executions
+                execution.error = str(e) or type(e).__name__
+                execution.status = TaskStatus.FAILED
+            finally:
+                execution.completed_at = execution.completed_at or time.time()
+                done[task.id].set()
 
-    def _wait_for_dependencies(self, task: Task) -> None:
-        """Wait for task dependencies to complete"""
-        while True:
-            all_deps_done = True
-            for dep_id in task.depends_on:
-                if dep_id in self.executions:
-                    dep_status = self.executions[dep_id].status
-                    if dep_status not in [TaskStatus.COMPLETED, TaskStatus.FAILED]:
-                        all_deps_done = False
-                        break
-            
-            if all_deps_done:
-                break
-            
-            time.sleep(0.1)  # Check every 100ms
+        await asyncio.gather(*(run(task) for task in tasks))
+        return self.executions
 
-    def _execute_single_task(
+    async def _execute_single_task_async(
         self,
         task: Task,
         shell_executor: Any,
         gui_executor: Any,
         text_injector: Any,
         command_router: Any,
-        vlm_client: Any
+        vlm_client: Any,
     ) -> Dict[str, Any]:
-        """Execute a single task with proper routing"""
-        
+        """Route one task in the pool, then run shell commands on this loop or hand the
+        rest back to the pool"""
+        loop = asyncio.get_running_loop()
+        route_info = await loop.run_in_executor(self.executor, self._begin, task, command_router)
+        commands = route_info.get("commands", [])
+        if route_info.get("path") == "shell" and commands:
+            shell_outcome = await shell_executor.run_async(commands)
+            return self._run_routed(task, route_info, gui_executor, text_injector, vlm_client,
+                                    shell_outcome)
+        return await loop.run_in_executor(
+            self.executor, self._run_routed,
+            task, route_info, gui_executor, text_injector, vlm_client,
+        )
+
+    def _begin(self, task: Task, command_router: Any) -> Dict[str, Any]:
+        """Mark the task running and route its instruction"""
         execution = self.executions[task.id]
         execution.status = TaskStatus.RUNNING
         execution.started_at = time.time()
-        
+        return command_router.route(task.instruction)
+
+    def _run_routed(
+        self,
+        task: Task,
+        route_info: Dict[str, Any],
+        gui_executor: Any,
+        text_injector: Any,
+        vlm_client: Any,
+        shell_outcome: Optional[Tuple[bool, Dict[str, Any]]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Execute a routed task. Shell commands are run by the caller on its event loop;
+        shell_outcome is their (ok, details).
+        """
+        execution = self.executions[task.id]
         try:
-            # Route the task instruction
-            route_info = command_router.route(task.instruction)
             path = route_info.get("path", "dictation")
             
             result = {"path": path, "success": False}
@@ -127,10 +157,9 @@ class ContextManager:
                 result["success"] = True
                 
             elif path == "shell":
-                commands = route_info.get("commands", [])
-                if commands:
-                    # Shell tasks can run in parallel (no GUI lock needed)
-                    ok, details = shell_executor.run(commands)
+                if shell_outcome is not None:
+                    # Shell tasks ran in parallel (no GUI lock needed)
+                    ok, details = shell_outcome
                     result["success"] = ok
                     result["details"] = details
                     
@@ -144,12 +173,9 @@ class ContextManager:
                     result["success"] = gui_result.get("success", False)
                     result["gui_details"] = gui_result
             
-            execution.completed_at = time.time()
             return result
-            
-        except Exception as e:
+        finally:
             execution.completed_at = time.time()
-            raise e
 
     def get_task_status(self, task_id: str) -> Optional[TaskStatus]:
         """Get current status of a task"""
@@ -4,22 +4,56 @@ Logs to data/csv/events.csv with rich fields described in README.
 """
 from __future__ import annotations
 
+import atexit
 import csv
 import json
+import threading
 import time
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
+
+try:
+    import orjson  # optional: C JSON encoder
+except Exception:  # pragma: no cover
+    orjson = None
+
+
+def _ser(x: Any) -> str:
+    """Serialize a field to JSON text; unknown types fall back to str()."""
+    if x is None:
+        return ""
+    if orjson is not None:
+        return orjson.dumps(x, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(x, default=str)
 
 
 class EventLogger:
-    def __init__(self, base_dir: str | Path = "data") -> None:
+    def __init__(
+        self,
+        base_dir: str | Path = "data",
+        *,
+        flush_every: int = 16,
+        flush_interval_s: float = 1.0,
+    ) -> None:
         self.base_dir = Path(base_dir)
         self.csv_dir = self.base_dir / "csv"
         self.csv_path = self.csv_dir / "events.csv"
         self.csv_dir.mkdir(parents=True, exist_ok=True)
         if not self.csv_path.exists():
             self._init_csv()
+        # Rows are buffered and appended in batches to amortize file open/close
+        self.flush_every = flush_every
+        self.flush_interval_s = flush_interval_s
+        self._buf: List[List[str]] = []
+        self._buf_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        # Flushes rows still buffered once a burst of events ends
+        self._timer: Optional[threading.Timer] = None
+        # One long-lived handle and writer instead of reopening per batch
+        self._f = open(self.csv_path, "a", newline="", encoding="utf-8")
+        self._w = csv.writer(self._f)
+        atexit.register(self.close)
 
     def _init_csv(self) -> None:
         headers = [
@@ -56,13 +90,6 @@ class EventLogger:
         audio_file: Optional[str] = None,
     ) -> None:
         ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
-        def _ser(x: Any) -> str:
-            if x is None:
-                return ""
-            try:
-                return json.dumps(x)
-            except Exception:
-                return str(x)
         row = [
             ts,
             user_request,
@@ -77,6 +104,42 @@ class EventLogger:
             audio_file or "",
             route_path,
         ]
-        with open(self.csv_path, "a", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow(row)
+        with self._buf_lock:
+            self._buf.append(row)
+            due = (
+                len(self._buf) >= self.flush_every
+                or time.monotonic() - self._last_flush >= self.flush_interval_s
+            )
+            if due:
+                self._flush_locked()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.flush_interval_s, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self) -> None:
+        """Write any buffered rows to the CSV."""
+        with self._buf_lock:
+            self._flush_locked()
+
+    def close(self) -> None:
+        """Flush buffered rows and close the CSV handle."""
+        with self._buf_lock:
+            if self._f.closed:
+                return
+            self._flush_locked()
+            self._f.close()
+
+    def _flush_locked(self) -> None:
+        self._last_flush = time.monotonic()
+        if self._timer is not None:
+            # No-op when this is the timer's own flush
+            self._timer.cancel()
+            self._timer = None
+        if not self._buf or self._f.closed:
+            return
+        rows, self._buf = self._buf, []
+        self._w.writerows(rows)
+        # Push whole batches to the OS so a crash never leaves a partial row
+        self._f.flush()
+
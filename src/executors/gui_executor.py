@@ -3,28 +3,132 @@ Uses pynput for mouse control and real_time.screenshot for captures.
 """
 from __future__ import annotations
 
-import math
-from typing import Any, Dict, Optional, Tuple
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
 
+import numpy as np
 from pynput.mouse import Controller as MouseController, Button
 
-from real_time.screenshot import capture_fullscreen
+from real_time.screenshot import capture_fullscreen, wait_written
+
+
+# Cmd+<key> shortcuts tried when the VLM finds no target; first matching keyword wins
+_FALLBACK_SHORTCUTS: Tuple[Tuple[str, str], ...] = (
+    ("compose", "n"),
+    ("new", "n"),
+    ("save", "s"),
+    ("copy", "c"),
+    ("paste", "v"),
+)
 
 
 class GUIExecutor:
-    def __init__(self, screen_monitor: Optional[object] = None) -> None:
+    def __init__(self, screen_monitor: Optional[object] = None, pred_cache_size: int = 64) -> None:
         self.mouse = MouseController()
-        # Optional continuous screenshot provider with get_recent_images(n:int) -> List[str]
+        self._keyboard = None  # created on first keyboard fallback
+        # Optional continuous screenshot provider with get_recent_unique_images(n, exclude_hashes)
+        # or get_recent_images(n) -> List[str]
         self.screen_monitor = screen_monitor
+        # VLM predictions keyed by ((pixel hash, scale) per frame, instruction), so an
+        # unchanged screen captured at the same resolution doesn't repeat the vision pass
+        self._pred_cache: "OrderedDict[Tuple[Tuple[Tuple[str, float], ...], str], Dict[str, Any]]" = OrderedDict()
+        self._pred_cache_size = pred_cache_size
+        self._pred_cache_lock = threading.Lock()
+
+    @staticmethod
+    def _targets_to_array(targets: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Pack targets into (xy[N,2] int, confidence[N] float); unparsable confidences count as 0."""
+        xy = np.array([[int(t.get("x", 0)), int(t.get("y", 0))] for t in targets], dtype=np.int64)
+        conf = np.zeros(len(targets), dtype=np.float64)
+        for i, t in enumerate(targets):
+            try:
+                conf[i] = float(t.get("confidence", 0.0))
+            except Exception:
+                pass
+        return xy.reshape(-1, 2), conf
+
+    def _context_images(self, exclude_hashes: Tuple[str, ...]) -> Optional[List[str]]:
+        """Recent monitor frames for VLM context, skipping ones identical to the analyzed frames."""
+        if not self.screen_monitor:
+            return None
+        try:
+            if hasattr(self.screen_monitor, "get_recent_unique_images"):
+                return self.screen_monitor.get_recent_unique_images(3, exclude_hashes=exclude_hashes)
+            if hasattr(self.screen_monitor, "get_recent_images"):
+                return self.screen_monitor.get_recent_images(3)
+        except Exception:
+            pass
+        return None
 
     @staticmethod
-    def _dist(a: Tuple[int, int], b: Tuple[int, int]) -> float:
-        return math.hypot(a[0] - b[0], a[1] - b[1])
+    def _scale_targets(targets: List[Dict[str, Any]], scale: float) -> List[Dict[str, Any]]:
+        """Map targets from file pixels back to screen pixels."""
+        if scale == 1.0:
+            return targets
+        scaled: List[Dict[str, Any]] = []
+        for t in targets:
+            try:
+                t = dict(t, x=int(round(float(t.get("x", 0)) * scale)),
+                         y=int(round(float(t.get("y", 0)) * scale)))
+            except Exception:
+                pass
+            scaled.append(t)
+        return scaled
+
+    def _suggest_frames(self, vlm_client: Any, caps: List[Dict[str, Any]], instruction: str,
+                        temperature: float) -> List[List[Dict[str, Any]]]:
+        """
+        One VLM request over all captures (memoized on their content); returns each
+        capture's targets in screen pixels, in order.
+        """
+        paths = []
+        for cap in caps:
+            wait_written(cap)
+            paths.append(cap.get("webp_path") or cap["png_path"])
+        # Pixel hashes match the screen monitor's regardless of the WEBP effort either used
+        hashes = tuple(cap["hash"] for cap in caps)
+        # Targets come back in the encoded file's pixels, so the cache also keys on each
+        # file's scale: a retry at another resolution must ask the VLM again
+        frame_keys = tuple(zip(hashes, (float(cap.get("scale", 1.0)) for cap in caps)))
+        key: Optional[Tuple[Tuple[Tuple[str, float], ...], str]] = (
+            (frame_keys, instruction) if frame_keys else None
+        )
+
+        pred = None
+        if key is not None:
+            with self._pred_cache_lock:
+                pred = self._pred_cache.get(key)
+                if pred is not None:
+                    self._pred_cache.move_to_end(key)
+        if pred is None:
+            pred = vlm_client.suggest_targets_multi(
+                frames=paths,
+                instruction=instruction,
+                context_images=self._context_images(hashes),
+                temperature=temperature
+            )
+            frames = pred.get("frames", []) if isinstance(pred, dict) else []
+            if key is not None and any(f.get("targets") for f in frames if isinstance(f, dict)):
+                with self._pred_cache_lock:
+                    self._pred_cache[key] = pred
+                    self._pred_cache.move_to_end(key)
+                    while len(self._pred_cache) > self._pred_cache_size:
+                        self._pred_cache.popitem(last=False)
+
+        frames = pred.get("frames", []) if isinstance(pred, dict) else []
+        out: List[List[Dict[str, Any]]] = []
+        for i, cap in enumerate(caps):
+            frame = frames[i] if i < len(frames) and isinstance(frames[i], dict) else {}
+            out.append(self._scale_targets(frame.get("targets", []), float(cap.get("scale", 1.0))))
+        return out
 
     def execute(self, *, instruction: str, vlm_client: Any, verify_radius: int = 32, 
-                max_retries: int = 3) -> Dict[str, Any]:
+                max_retries: int = 3, record_prev_pos: bool = False) -> Dict[str, Any]:
         """
         Execute GUI action with VLM retry logic and fallback to keyboard shortcuts.
+        The pre-click cursor position costs an extra window-server round trip, so it is
+        only read (into mouse_move_from) when record_prev_pos=True, e.g. for logging or undo.
         Returns a dict: {
           success: bool,
           target: {x, y, label, confidence} | None,
@@ -45,32 +149,25 @@ class GUIExecutor:
             try:
                 # Capture screenshot with different strategies per attempt
                 if attempt == 0:
-                    before_cap = capture_fullscreen(prefix="before")
+                    prefix, cap_kwargs = "before", {"for_vlm": True}
                 elif attempt == 1:
                     # Retry with different compression/resolution
-                    before_cap = capture_fullscreen(prefix="retry1", compress=False)
+                    prefix, cap_kwargs = "retry1", {"compress": False}
                 else:
                     # Final attempt with cropped/zoomed screenshot
-                    before_cap = capture_fullscreen(prefix="retry2", max_width=1280)
+                    prefix, cap_kwargs = "retry2", {"max_width": 1280}
+                # The verification frame is grabbed right after so both go to the VLM in one request
+                before_cap = capture_fullscreen(prefix=prefix, background=True, **cap_kwargs)
+                verify_cap = capture_fullscreen(prefix="verify", background=True, **cap_kwargs)
                 
                 out["screenshots"][f"attempt_{attempt}"] = before_cap
-                image_path = before_cap.get("webp_path") or before_cap["png_path"]
+                out["screenshots"]["verify"] = verify_cap
 
                 # Adjust VLM temperature per attempt (more creative on retries)
                 temp = 0.3 + (attempt * 0.1)
-                context_imgs = None
-                if self.screen_monitor and hasattr(self.screen_monitor, "get_recent_images"):
-                    try:
-                        context_imgs = self.screen_monitor.get_recent_images(3)
-                    except Exception:
-                        context_imgs = None
-                pred = vlm_client.suggest_targets(
-                    image_path=image_path,
-                    instruction=instruction,
-                    context_images=context_imgs,
-                    temperature=min(temp, 0.7)
+                targets, v_targets = self._suggest_frames(
+                    vlm_client, [before_cap, verify_cap], instruction, min(temp, 0.7)
                 )
-                targets = pred.get("targets", []) if isinstance(pred, dict) else []
                 
                 if not targets:
                     if attempt == max_retries - 1:
@@ -79,20 +176,16 @@ class GUIExecutor:
                     continue
 
                 # Choose highest confidence target
-                def conf(t: Dict[str, Any]) -> float:
-                    try:
-                        return float(t.get("confidence", 0.0))
-                    except Exception:
-                        return 0.0
-                
-                best = max(targets, key=conf)
-                confidence = conf(best)
+                xy, conf = self._targets_to_array(targets)
+                best_idx = int(conf.argmax())
+                best = targets[best_idx]
+                confidence = float(conf[best_idx])
                 
                 # Skip low confidence targets on early attempts
                 if attempt < 2 and confidence < 0.5:
                     continue
                 
-                tx, ty = int(best.get("x", 0)), int(best.get("y", 0))
+                tx, ty = int(xy[best_idx, 0]), int(xy[best_idx, 1])
                 out["target"] = {
                     "x": tx,
                     "y": ty,
@@ -100,46 +193,29 @@ class GUIExecutor:
                     "confidence": confidence,
                 }
 
-                # Pre-click verification
-                verify_cap = capture_fullscreen(prefix="verify")
-                out["screenshots"]["verify"] = verify_cap
-                v_path = verify_cap.get("webp_path") or verify_cap["png_path"]
-                v_context_imgs = None
-                if self.screen_monitor and hasattr(self.screen_monitor, "get_recent_images"):
-                    try:
-                        v_context_imgs = self.screen_monitor.get_recent_images(3)
-                    except Exception:
-                        v_context_imgs = None
-                v_pred = vlm_client.suggest_targets(
-                    image_path=v_path,
-                    instruction=instruction,
-                    context_images=v_context_imgs,
-                    temperature=0.3
-                )
-                v_targets = v_pred.get("targets", []) if isinstance(v_pred, dict) else []
-                
                 # Check if target still exists nearby
                 near = False
-                for t in v_targets:
-                    vx, vy = int(t.get("x", 0)), int(t.get("y", 0))
-                    if self._dist((vx, vy), (tx, ty)) <= verify_radius:
-                        near = True
-                        break
+                if v_targets:
+                    # Deferred so numba's import/JIT cost only hits the GUI path
+                    from real_time._num import nearest
+                    vxy, _ = self._targets_to_array(v_targets)
+                    near, closest_idx = nearest(
+                        np.ascontiguousarray(vxy, dtype=np.float64), float(tx), float(ty), float(verify_radius)
+                    )
                 
                 if not near and v_targets and attempt < max_retries - 1:
                     # Target moved, try again
                     continue
                 elif not near and v_targets:
                     # Update to closest target on final attempt
-                    closest = min(v_targets, key=lambda t: self._dist((int(t.get("x", 0)), int(t.get("y", 0))), (tx, ty)))
-                    tx, ty = int(closest.get("x", tx)), int(closest.get("y", ty))
+                    tx, ty = int(vxy[closest_idx, 0]), int(vxy[closest_idx, 1])
 
                 # Execute click
-                prev_pos = self.mouse.position
+                prev_pos = self.mouse.position if record_prev_pos else None
                 self.mouse.position = (tx, ty)
                 self.mouse.click(Button.left, 1)
 
-                after_cap = capture_fullscreen(prefix="after")
+                after_cap = capture_fullscreen(prefix="after", background=True)
                 out["screenshots"]["after"] = after_cap
 
                 out["success"] = True
@@ -162,39 +238,20 @@ class GUIExecutor:
     def _fallback_keyboard_action(self, instruction: str, out: Dict[str, Any]) -> Dict[str, Any]:
         """Fallback to deterministic keyboard shortcuts when VLM fails"""
         from pynput.keyboard import Controller as KeyboardController, Key
-        
-        keyboard = KeyboardController()
+
         low_instruction = instruction.lower()
-        
+        key = next((k for word, k in _FALLBACK_SHORTCUTS if word in low_instruction), None)
+        if key is None:
+            out["error"] = "no_fallback_available"
+            return out
+
         try:
-            # Common keyboard shortcuts as fallback
-            if "compose" in low_instruction or "new" in low_instruction:
-                keyboard.key_down(Key.cmd)
-                keyboard.press('n')
-                keyboard.key_up(Key.cmd)
-                out["success"] = True
-                out["fallback"] = "keyboard_shortcut_cmd_n"
-            elif "save" in low_instruction:
-                keyboard.key_down(Key.cmd)
-                keyboard.press('s')
-                keyboard.key_up(Key.cmd)
-                out["success"] = True
-                out["fallback"] = "keyboard_shortcut_cmd_s"
-            elif "copy" in low_instruction:
-                keyboard.key_down(Key.cmd)
-                keyboard.press('c')
-                keyboard.key_up(Key.cmd)
-                out["success"] = True
-                out["fallback"] = "keyboard_shortcut_cmd_c"
-            elif "paste" in low_instruction:
-                keyboard.key_down(Key.cmd)
-                keyboard.press('v')
-                keyboard.key_up(Key.cmd)
-                out["success"] = True
-                out["fallback"] = "keyboard_shortcut_cmd_v"
-            else:
-                out["error"] = "no_fallback_available"
-                
+            if self._keyboard is None:
+                self._keyboard = KeyboardController()
+            with self._keyboard.pressed(Key.cmd):
+                self._keyboard.tap(key)
+            out["success"] = True
+            out["fallback"] = f"keyboard_shortcut_cmd_{key}"
         except Exception as e:
             out["error"] = f"fallback_failed: {e}"
             
@@ -2,56 +2,167 @@
 - Accepts list-of-lists tokens or list of strings.
 - Handles 'cd' by updating cwd for subsequent commands.
 - Captures stdout/stderr for logging.
-- Integrates safety confirmation gates.
+- Integrates safety confirmation gates via a pluggable confirm_fn (stdin by default).
+- Optionally runs the commands between 'cd's concurrently (parallel=True).
+- run_async() does the same on the caller's event loop, for asyncio orchestrators.
 """
 from __future__ import annotations
 
+import asyncio
 import shlex
 import subprocess
 from pathlib import Path
-from typing import List, Tuple, Dict, Any, Optional
+from typing import Callable, List, Tuple, Dict, Any, Optional
 
 from safety_manager import SafetyManager
 
 
+def _default_confirm(prompt: str) -> bool:
+    """Ask on stdin; anything but 'yes' (or a closed/interrupted stdin) declines."""
+    try:
+        return input(prompt).strip().lower() == "yes"
+    except (EOFError, KeyboardInterrupt):
+        return False
+
+
 class ShellExecutor:
-    def __init__(self, base_cwd: Optional[str | Path] = None) -> None:
+    def __init__(self, base_cwd: Optional[str | Path] = None,
+                 confirm_fn: Optional[Callable[[str], bool]] = None) -> None:
+        """
+        confirm_fn(prompt) -> bool gates dangerous batches; it is called from whichever
+        thread runs run(). To confirm through an asyncio UI (e.g. a websocket prompt),
+        pass a sync wrapper such as
+        lambda p: asyncio.run_coroutine_threadsafe(ask(p), loop).result()
+        and call run() off the event loop thread; run_async() already calls it in an executor.
+        """
         self.base_cwd = str(base_cwd) if base_cwd else None
         self.safety = SafetyManager()
+        self._confirm = confirm_fn or _default_confirm
 
     def _to_tokens(self, cmd: Any) -> List[str]:
         if isinstance(cmd, list):
             return [str(t) for t in cmd]
         return shlex.split(str(cmd))
 
+    @staticmethod
+    def _chdir(cwd: Path, tokens: List[str]) -> Path:
+        new_dir = Path(tokens[1] if len(tokens) > 1 else ".")
+        return new_dir if new_dir.is_absolute() else (cwd / new_dir).resolve()
+
+    @staticmethod
+    def _error_result(tokens: List[str], cwd: Path, err: str) -> Dict[str, Any]:
+        return {"cmd": tokens, "cwd": str(cwd), "returncode": -1, "stdout": "", "stderr": err}
+
+    async def _run_one_async(self, tokens: List[str], cwd: Path, timeout: int) -> Dict[str, Any]:
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *tokens,
+                cwd=cwd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+        except Exception as e:
+            return self._error_result(tokens, cwd, str(e))
+        try:
+            out, err = await asyncio.wait_for(proc.communicate(), timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            return self._error_result(tokens, cwd, f"Command {tokens!r} timed out after {timeout} seconds")
+        except asyncio.CancelledError:
+            # The caller gave up (e.g. an outer task timeout); don't leave the process
+            # running, and reap it before the loop can close
+            proc.kill()
+            await proc.wait()
+            raise
+        return {
+            "cmd": tokens,
+            "cwd": str(cwd),
+            "returncode": proc.returncode,
+            "stdout": out.decode(errors="replace"),
+            "stderr": err.decode(errors="replace"),
+        }
+
+    async def _run_async(self, token_commands: List[List[str]], cwd: Path,
+                         timeout: int, parallel: bool = True) -> List[Dict[str, Any]]:
+        """
+        Run commands segment by segment: each 'cd' is a barrier that updates cwd,
+        and the commands between two barriers are launched concurrently
+        (one at a time with parallel=False). Results keep the input order.
+        """
+        results: List[Dict[str, Any]] = []
+        segment: List[List[str]] = []
+
+        async def flush() -> None:
+            if segment:
+                results.extend(await asyncio.gather(
+                    *(self._run_one_async(tokens, cwd, timeout) for tokens in segment)
+                ))
+                segment.clear()
+
+        for tokens in token_commands:
+            if tokens[0] == "cd":
+                await flush()
+                cwd = self._chdir(cwd, tokens)
+                results.append({"cmd": tokens, "cwd": str(cwd), "returncode": 0, "stdout": "", "stderr": ""})
+                continue
+            segment.append(tokens)
+            if not parallel:
+                await flush()
+        await flush()
+        return results
+
+    def _confirmation_prompt(self, token_commands: List[List[str]], interactive: bool) -> Optional[str]:
+        """Prompt to show before running, or None when the batch needs no confirmation"""
+        if interactive and self.safety.requires_confirmation(token_commands):
+            return self.safety.get_confirmation_prompt(token_commands)
+        return None
+
+    def _tokenize_all(self, commands: List[Any]) -> List[List[str]]:
+        token_commands = [self._to_tokens(cmd) for cmd in commands]
+        return [tokens for tokens in token_commands if tokens]
+
+    async def run_async(self, commands: List[Any], cwd: Optional[str | Path] = None, timeout: int = 120,
+                        interactive: bool = True, parallel: bool = False) -> Tuple[bool, Dict[str, Any]]:
+        """
+        run() on the running event loop: processes are asyncio subprocesses, so many
+        tasks' commands can be in flight on one thread. confirm_fn runs in the default
+        executor so a stdin prompt doesn't block the loop.
+        """
+        cur_cwd = Path(cwd or self.base_cwd or ".").resolve()
+        token_commands = self._tokenize_all(commands)
+        prompt = self._confirmation_prompt(token_commands, interactive)
+        if prompt is not None:
+            confirmed = await asyncio.get_running_loop().run_in_executor(None, self._confirm, prompt)
+            if not confirmed:
+                return False, {"results": [], "error": "User cancelled dangerous operation"}
+        results = await self._run_async(token_commands, cur_cwd, timeout, parallel)
+        return all(r["returncode"] == 0 for r in results), {"results": results}
+
     def run(self, commands: List[Any], cwd: Optional[str | Path] = None, timeout: int = 120, 
-            interactive: bool = True) -> Tuple[bool, Dict[str, Any]]:
-        cur_cwd = str(cwd or self.base_cwd or ".")
+            interactive: bool = True, parallel: bool = False) -> Tuple[bool, Dict[str, Any]]:
+        cur_cwd = Path(cwd or self.base_cwd or ".").resolve()
         results: List[Dict[str, Any]] = []
         all_ok = True
         
-        # Convert to token lists for safety check
-        token_commands = [self._to_tokens(cmd) for cmd in commands if self._to_tokens(cmd)]
+        # Tokenize once; reused by the safety gate and the execution loop
+        token_commands = self._tokenize_all(commands)
         
         # Safety gate: check for dangerous operations
-        if interactive and self.safety.requires_confirmation(token_commands):
-            prompt = self.safety.get_confirmation_prompt(token_commands)
-            try:
-                response = input(prompt).strip().lower()
-                if response != 'yes':
-                    return False, {"results": [], "error": "User cancelled dangerous operation"}
-            except (EOFError, KeyboardInterrupt):
-                return False, {"results": [], "error": "User cancelled dangerous operation"}
+        prompt = self._confirmation_prompt(token_commands, interactive)
+        if prompt is not None and not self._confirm(prompt):
+            return False, {"results": [], "error": "User cancelled dangerous operation"}
+
+        if parallel:
+            # Must not be called from a thread with a running event loop
+            results = asyncio.run(self._run_async(token_commands, cur_cwd, timeout))
+            return all(r["returncode"] == 0 for r in results), {"results": results}
         
-        for cmd in commands:
-            tokens = self._to_tokens(cmd)
-            if not tokens:
-                continue
+        for tokens in token_commands:
             if tokens[0] == "cd":
                 # Update working directory for subsequent commands
-                new_dir = tokens[1] if len(tokens) > 1 else "."
-                cur_cwd = str(Path(cur_cwd) / new_dir) if not Path(new_dir).is_absolute() else new_dir
-                results.append({"cmd": tokens, "cwd": cur_cwd, "returncode": 0, "stdout": "", "stderr": ""})
+                cur_cwd = self._chdir(cur_cwd, tokens)
+                results.append({"cmd": tokens, "cwd": str(cur_cwd), "returncode": 0, "stdout": "", "stderr": ""})
                 continue
             try:
                 proc = subprocess.run(
@@ -65,18 +176,12 @@ class ShellExecutor:
                 all_ok = all_ok and ok
                 results.append({
                     "cmd": tokens,
-                    "cwd": cur_cwd,
+                    "cwd": str(cur_cwd),
                     "returncode": proc.returncode,
                     "stdout": proc.stdout,
                     "stderr": proc.stderr,
                 })
             except Exception as e:
                 all_ok = False
-                results.append({
-                    "cmd": tokens,
-                    "cwd": cur_cwd,
-                    "returncode": -1,
-                    "stdout": "",
-                    "stderr": str(e),
-                })
+                results.append(self._error_result(tokens, cur_cwd, str(e)))
         return all_ok, {"results": results}
@@ -0,0 +1,39 @@
+"""
+Numeric kernels for the GUI loop. Compiled with numba when it is installed
+(cached on disk, GIL released); otherwise an equivalent NumPy version is used.
+"""
+from typing import Tuple
+
+import numpy as np
+
+try:
+    from numba import njit
+except Exception:  # pragma: no cover
+    njit = None
+
+
+def _nearest_loop(vxy: np.ndarray, tx: float, ty: float, r: float) -> Tuple[bool, int]:
+    best = -1
+    bd = 1e18
+    near = False
+    for i in range(vxy.shape[0]):
+        dx = vxy[i, 0] - tx
+        dy = vxy[i, 1] - ty
+        d = (dx * dx + dy * dy) ** 0.5
+        if d <= r:
+            near = True
+        if d < bd:
+            bd = d
+            best = i
+    return near, best
+
+
+def _nearest_np(vxy: np.ndarray, tx: float, ty: float, r: float) -> Tuple[bool, int]:
+    if vxy.shape[0] == 0:
+        return False, -1
+    d = np.hypot(vxy[:, 0] - tx, vxy[:, 1] - ty)
+    return bool((d <= r).any()), int(d.argmin())
+
+
+# nearest(vxy[N,2] float64, tx, ty, r) -> (any point within r, index of the closest point or -1)
+nearest = njit(cache=True, nogil=True)(_nearest_loop) if njit is not None else _nearest_np
@@ -3,6 +3,42 @@ from typing import Optional, Tuple
 from PIL import Image
 
 
+def _compress_pil(
+    im: Image.Image,
+    output_path: str,
+    *,
+    max_width: Optional[int] = 1920,
+    quality: int = 80,
+    fmt: str = "WEBP",
+    method: int = 4,
+) -> Tuple[Tuple[int, int], Tuple[int, int]]:
+    """
+    Resize and encode an in-memory image to output_path.
+
+    method is the libwebp effort level (0-6); 6 is ~3x slower than 4 for ~1% smaller files.
+
+    Returns (original_size, new_size).
+    """
+    orig_size = im.size
+    # Convert to RGB for WEBP/JPEG safety
+    if im.mode not in ("RGB", "L"):
+        im = im.convert("RGB")
+    w, h = im.size
+    if max_width and w > max_width:
+        new_h = int(h * (max_width / float(w)))
+        # reducing_gap box-reduces by an integer factor first, then Lanczos on the smaller image
+        im = im.resize((max_width, new_h), Image.LANCZOS, reducing_gap=3.0)
+    new_size = im.size
+    save_kwargs = {"optimize": True}
+    if fmt.upper() in ("JPEG", "JPG"):
+        save_kwargs.update({"quality": quality})
+    elif fmt.upper() == "WEBP":
+        save_kwargs.update({"quality": quality, "method": method})
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    im.save(output_path, fmt.upper(), **save_kwargs)
+    return orig_size, new_size
+
+
 def compress_image(
     input_path: str,
     output_path: Optional[str] = None,
@@ -10,12 +46,13 @@ def compress_image(
     max_width: Optional[int] = 1920,
     quality: int = 80,
     fmt: str = "WEBP",
+    method: int = 4,
 ) -> Tuple[str, Tuple[int, int], Tuple[int, int]]:
     """
     Compress an image using Pillow.
 
     - Resizes to max_width while preserving aspect ratio (if needed).
-    - Saves as WEBP (default) or JPEG with optimization.
+    - Saves as WEBP (default) or JPEG with optimization; pass method=6 for archival WEBP.
 
     Returns (output_path, original_size, new_size).
     """
@@ -26,21 +63,8 @@ def compress_image(
         output_path = str(src.with_suffix("") ) + "-compressed" + suffix
 
     with Image.open(src) as im:
-        orig_size = im.size
-        # Convert to RGB for WEBP/JPEG safety
-        if im.mode not in ("RGB", "L"):
-            im = im.convert("RGB")
-        w, h = im.size
-        if max_width and w > max_width:
-            new_h = int(h * (max_width / float(w)))
-            im = im.resize((max_width, new_h), Image.LANCZOS)
-        new_size = im.size
-        save_kwargs = {"optimize": True}
-        if fmt.upper() in ("JPEG", "JPG"):
-            save_kwargs.update({"quality": quality})
-        elif fmt.upper() == "WEBP":
-            save_kwargs.update({"quality": quality, "method": 6})
-        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
-        im.save(output_path, fmt.upper(), **save_kwargs)
+        orig_size, new_size = _compress_pil(
+            im, output_path, max_width=max_width, quality=quality, fmt=fmt, method=method
+        )
 
     return output_path, orig_size, new_size
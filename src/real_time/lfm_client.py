@@ -1,8 +1,41 @@
 import json
 import os
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
-from llama_cpp import Llama
+from llama_cpp import Llama, LlamaGrammar
+
+try:
+    import orjson  # optional: C JSON parser
+except Exception:  # pragma: no cover
+    orjson = None
+
+from real_time.prompt_cache import attach_prompt_cache
+
+
+# Constant prompt prefixes; kept byte-identical so llama.cpp can reuse their KV state
+CORRECT_SYSTEM_PROMPT = (
+    "You improve grammar, casing, and punctuation of short transcriptions. "
+    "Do not change meaning. Output only the corrected text, without quotes."
+)
+
+COMMANDS_SYSTEM_PROMPT = (
+    "You are a command generator for macOS. "
+    "Translate user instructions into a JSON array of arrays of shell commands. "
+    "Use 'open -a' for apps, 'open \"<URL>\"' for links, and 'git' for repo actions. "
+    "Never output explanations; output only JSON. "
+    "Avoid destructive commands. Ask for confirmation if risk is detected."
+)
+
+# Constrains generate_commands output to a compact JSON array of string arrays
+COMMANDS_GRAMMAR = r"""
+root ::= "[" (cmd ("," cmd)*)? "]"
+cmd  ::= "[" str ("," str)* "]"
+str  ::= "\"" ([^"\\\x7F\x00-\x1F] | "\\" ["\\/bfnrt])* "\""
+"""
+
+
+def _loads(content: str) -> Any:
+    return orjson.loads(content) if orjson is not None else json.loads(content)
 
 
 class LFMClient:
@@ -17,17 +50,48 @@ class LFMClient:
     def __init__(
         self,
         repo_id: str = "unsloth/LFM2-1.2B-GGUF",
-        filename: str = "LFM2-1.2B-F16.gguf",
+        filename: str = "LFM2-1.2B-Q4_K_M.gguf",
         n_ctx: int = 4096,
         n_threads: Optional[int] = None,
+        n_gpu_layers: Optional[int] = None,
+        n_batch: int = 512,
+        flash_attn: bool = True,
+        prompt_cache_bytes: int = 256 << 20,
     ) -> None:
+        """
+        Defaults to the Q4_K_M quant: decode is memory-bandwidth bound, so int4 weights
+        roughly double throughput over F16 (pass the F16 filename for accuracy comparisons).
+        n_gpu_layers defaults to DADOS_GPU_LAYERS, else -1 (offload everything to Metal/CUDA
+        when llama.cpp was built with it; ignored on CPU-only builds).
+        """
+        if n_gpu_layers is None:
+            n_gpu_layers = int(os.environ.get("DADOS_GPU_LAYERS", "-1"))
         self.model = Llama.from_pretrained(
             repo_id=repo_id,
             filename=filename,
             n_ctx=n_ctx,
             # Let llama-cpp decide default threads if None
             n_threads=n_threads or os.cpu_count() or 4,
+            n_gpu_layers=n_gpu_layers,
+            n_batch=n_batch,
+            flash_attn=flash_attn,
         )
+        # Prefix KV cache, persisted across restarts, so the fixed prompts aren't re-prefilled
+        attach_prompt_cache(
+            self.model, [CORRECT_SYSTEM_PROMPT, COMMANDS_SYSTEM_PROMPT], prompt_cache_bytes, keep=2
+        )
+        self._commands_grammar = LlamaGrammar.from_string(COMMANDS_GRAMMAR, verbose=False)
+        # (library dict, its serialized JSON); the dict is held so identity checks stay valid
+        self._lib_blob: Optional[Tuple[Dict[str, Any], str]] = None
+
+    def _library_json(self, command_library: Dict[str, Any]) -> str:
+        """Serialize the command library once per library object rather than per call."""
+        cached = self._lib_blob
+        if cached is not None and cached[0] is command_library:
+            return cached[1]
+        blob = json.dumps(command_library, indent=2)
+        self._lib_blob = (command_library, blob)
+        return blob
 
     def correct_text(
         self,
@@ -41,12 +105,8 @@ class LFMClient:
         Light grammar and punctuation correction. Returns corrected text only.
         Fallbacks to original text on error.
         """
-        prompt_system = (
-            "You improve grammar, casing, and punctuation of short transcriptions. "
-            "Do not change meaning. Output only the corrected text, without quotes."
-        )
         messages = [
-            {"role": "system", "content": prompt_system},
+            {"role": "system", "content": CORRECT_SYSTEM_PROMPT},
             {"role": "user", "content": [{"type": "text", "text": text}]},
         ]
         try:
@@ -77,17 +137,9 @@ class LFMClient:
         """
         available_ops = available_ops or []
 
-        system_prompt = (
-            "You are a command generator for macOS. "
-            "Translate user instructions into a JSON array of arrays of shell commands. "
-            "Use 'open -a' for apps, 'open \"<URL>\"' for links, and 'git' for repo actions. "
-            "Never output explanations; output only JSON. "
-            "Avoid destructive commands. Ask for confirmation if risk is detected."
-        )
-
         dyn_ops = "\n".join(f"- {op}" for op in available_ops)
         context_blob = (
-            "Command library JSON (verbatim):\n" + json.dumps(command_library, indent=2) +
+            "Command library JSON (verbatim):\n" + self._library_json(command_library) +
             "\n\nAvailable operations (high-level, via pynput & system tools):\n"
             "- mouse.move(dx, dy)\n"
             "- mouse.position=(x, y)\n"
@@ -99,11 +151,13 @@ class LFMClient:
             + ("\nUser-provided additional operations:\n" + dyn_ops if dyn_ops else "")
         )
 
+        # The library/ops context rarely changes, so it goes in the system message ahead of
+        # the instruction; the whole prefix is then shared with previous calls' KV cache
         messages = [
-            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": COMMANDS_SYSTEM_PROMPT + "\n\n" + context_blob},
             {"role": "user", "content": [
                 {"type": "text", "text": (
-                    "Instruction:\n" + instruction + "\n\n" + context_blob +
+                    "Instruction:\n" + instruction +
                     "\nOutput strictly JSON array-of-arrays, e.g. [[\"open\", \"-a\", \"Google Chrome\"]]."
                 )}
             ]},
@@ -114,27 +168,16 @@ class LFMClient:
             temperature=temperature,
             top_p=top_p,
             max_tokens=max_tokens,
+            grammar=self._commands_grammar,
         )
 
         content = resp["choices"][0]["message"]["content"].strip()
-        # Extract first JSON array present
+        # The grammar guarantees the shape; this only fails if max_tokens cut the array short
         try:
-            parsed = json.loads(content)
-            if isinstance(parsed, list) and all(isinstance(x, list) for x in parsed):
-                return self._safety_filter(parsed)
+            parsed = _loads(content)
         except Exception:
-            pass
-        # Fallback: attempt to find JSON substring
-        start = content.find("[")
-        end = content.rfind("]")
-        if start != -1 and end != -1 and end > start:
-            try:
-                parsed = json.loads(content[start:end + 1])
-                if isinstance(parsed, list) and all(isinstance(x, list) for x in parsed):
-                    return self._safety_filter(parsed)
-            except Exception:
-                pass
-        return []
+            return []
+        return self._safety_filter(parsed)
 
     def _safety_filter(self, commands: List[List[str]]) -> List[List[str]]:
         """Drop obviously dangerous commands; simple allowlist-style filter."""
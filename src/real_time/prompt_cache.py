@@ -0,0 +1,105 @@
+"""
+Prompt-prefix KV cache shared by the llama-cpp clients.
+
+A LlamaRAMCache lets llama.cpp skip re-prefilling a prompt prefix it has already
+evaluated. The most recent cached states are also written under data/cache/kv/
+at exit, so a restarted process starts with the system prompts already warm.
+"""
+import atexit
+import copy
+import hashlib
+import os
+import pickle
+from pathlib import Path
+from typing import Any, Optional, Sequence
+
+try:
+    from llama_cpp import LlamaRAMCache
+except Exception:  # pragma: no cover
+    LlamaRAMCache = None
+
+
+DEFAULT_KV_DIR = Path(__file__).resolve().parents[2] / "data" / "cache" / "kv"
+_VERSION = 1
+
+
+def _fingerprint(model: Any, prompts: Sequence[str]) -> Optional[str]:
+    """Identify weights (path, size, mtime), context size, and prompts; None if unknown."""
+    model_path = getattr(model, "model_path", None)
+    if not model_path:
+        return None
+    try:
+        st = os.stat(model_path)
+    except OSError:
+        return None
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{_VERSION}:{os.path.abspath(model_path)}:{st.st_size}:{st.st_mtime_ns}".encode("utf-8"))
+    h.update(f":{model.n_ctx()}".encode("utf-8"))
+    for p in prompts:
+        h.update(b"\0" + p.encode("utf-8"))
+    return h.hexdigest()
+
+
+def _load(cache: Any, path: Path, fingerprint: str) -> None:
+    if not path.exists():
+        return
+    try:
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        if state.get("version") != _VERSION or state.get("fingerprint") != fingerprint:
+            return
+        for key, llama_state in state.get("entries", []):
+            cache[key] = llama_state
+    except Exception as e:
+        print(f"[warn] Prompt cache load failed: {e}")
+
+
+def _save(cache: Any, path: Path, fingerprint: str, keep: int) -> None:
+    """Write the `keep` most recently used states atomically."""
+    entries = []
+    for key, llama_state in list(cache.cache_state.items())[-keep:]:
+        # Only the last logits row is meaningful after a restore; the full
+        # (n_batch x n_vocab) matrix would dominate the file size
+        slim = copy.copy(llama_state)
+        slim.scores = llama_state.scores[-1:].copy()
+        entries.append((key, slim))
+    if not entries:
+        return
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(
+                {"version": _VERSION, "fingerprint": fingerprint, "entries": entries},
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(tmp, path)
+    except Exception as e:
+        print(f"[warn] Prompt cache save failed: {e}")
+
+
+def attach_prompt_cache(
+    model: Any,
+    prompts: Sequence[str],
+    capacity_bytes: int,
+    *,
+    persist_dir: Optional[Path] = DEFAULT_KV_DIR,
+    keep: int = 1,
+) -> None:
+    """
+    Give `model` a prefix KV cache of `capacity_bytes`, restoring states saved by a
+    previous process when the weights, context size, and `prompts` are unchanged.
+    `keep` is how many recent states to persist (one per distinct system prompt).
+    """
+    if LlamaRAMCache is None or not capacity_bytes:
+        return
+    cache = LlamaRAMCache(capacity_bytes=capacity_bytes)
+    model.set_cache(cache)
+
+    fingerprint = _fingerprint(model, prompts) if persist_dir else None
+    if fingerprint is None:
+        return
+    path = Path(persist_dir) / f"{Path(model.model_path).stem}-{fingerprint[:16]}.pkl"
+    _load(cache, path, fingerprint)
+    atexit.register(_save, cache, path, fingerprint, keep)
@@ -1,13 +1,93 @@
+import hashlib
+import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Any, Callable, Dict, Optional
 
 import pyautogui
+from PIL import Image
 
-from real_time.image_utils import compress_image
+try:
+    import mss  # optional: native grab (CoreGraphics/XShm/BitBlt) without PIL
+except Exception:  # pragma: no cover
+    mss = None
+try:
+    import xxhash  # optional: fast non-cryptographic frame hashing
+except Exception:  # pragma: no cover
+    xxhash = None
+
+from real_time.image_utils import _compress_pil
 
 
 DEFAULT_DIR = Path(__file__).resolve().parents[2] / "data" / "screenshots"
+# The VLM downsamples internally to roughly this width; extra pixels only cost encode and prefill
+VLM_MAX_WIDTH = 896
+
+# Encodes and writes captures off the caller's thread (Pillow releases the GIL while encoding)
+_IO_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="screenshot-io")
+
+
+class _Capturer(threading.local):
+    """
+    Per-thread screen grabber. mss handles are not safe to share across threads,
+    so each thread (monitor loop, GUI executor) keeps its own handle.
+    """
+
+    def __init__(self) -> None:
+        self._sct = None
+
+    def grab(self) -> Image.Image:
+        if mss is None:
+            return pyautogui.screenshot()
+        if self._sct is None:
+            self._sct = mss.mss()
+        # monitors[1] is the primary display, matching pyautogui and the coordinate
+        # space pynput clicks in; monitors[0] is the bounding box of all displays
+        raw = self._sct.grab(self._sct.monitors[1])
+        # The BGRX -> RGB unpack is the only copy of the frame
+        return Image.frombytes("RGB", raw.size, raw.bgra, "raw", "BGRX")
+
+
+_capturer = _Capturer()
+
+
+def grab_screen() -> Image.Image:
+    """Grab the screen into memory without encoding; see capture_fullscreen(image=...)."""
+    return _capturer.grab()
+
+
+def _atomic_write(path: Path, write: Callable[[str], Any]) -> None:
+    # Dot-prefixed temp name so directory scans never pick up a half-written file
+    tmp = path.with_name(f".{path.name}.tmp")
+    write(str(tmp))
+    os.replace(tmp, path)
+
+
+def _encode(result: Dict[str, Any], im: Image.Image, png_path: Optional[Path],
+            webp_path: Optional[Path], max_width: int, webp_method: int) -> None:
+    result["hash"] = image_hash(im)
+    if png_path is not None:
+        _atomic_write(png_path, lambda tmp: im.save(tmp, "PNG"))
+    if webp_path is not None:
+        _atomic_write(webp_path, lambda tmp: _compress_pil(
+            im, tmp, fmt="WEBP", max_width=max_width, method=webp_method))
+
+
+def image_hash(im: Image.Image) -> str:
+    """Hash of a frame's decoded pixels, so it doesn't depend on how (or whether) it was encoded."""
+    data = im.tobytes()
+    if xxhash is not None:
+        return xxhash.xxh3_64(data).hexdigest()
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+def wait_written(capture: Dict[str, Any]) -> None:
+    """Block until a background capture's files exist; re-raises any encode error."""
+    pending = capture.get("pending")
+    if pending is not None:
+        pending.result()
 
 
 def capture_fullscreen(
@@ -16,13 +96,28 @@ def capture_fullscreen(
     prefix: str = "shot",
     compress: bool = True,
     max_width: int = 1920,
-) -> Dict[str, str]:
+    keep_png: bool = False,
+    for_vlm: bool = False,
+    background: bool = False,
+    image: Optional[Image.Image] = None,
+    webp_method: int = 4,
+) -> Dict[str, Any]:
     """
-    Capture a full-screen screenshot to PNG under data/screenshots/.
-    Optionally create a compressed WEBP copy.
+    Capture a full-screen screenshot under data/screenshots/.
+    With compress=True (default) only a WEBP is written, encoded straight from
+    the in-memory grab; pass keep_png=True to also save the lossless PNG.
+    With compress=False the PNG is always written. for_vlm caps the WEBP width
+    at VLM_MAX_WIDTH. webp_method is the libwebp effort; 0 is fastest, for frequent
+    captures where encode time matters more than size. With background=True encoding
+    and writing happen on a worker thread and the result carries a "pending" future;
+    call wait_written() before reading the files. Pass image (from grab_screen) to save a frame grabbed earlier,
+    e.g. on another thread, instead of grabbing now.
 
-    Returns dict with keys: png_path, webp_path (optional), file_uri.
+    Returns dict with keys: png_path (optional), webp_path (optional), file_uri, scale,
+    hash, pending (background only). hash is image_hash() of the captured frame; with
+    background=True it is set once the capture is written.
     file_uri is the file:// URI to the (compressed if available else PNG) file.
+    scale maps pixel coordinates in that file back to the captured frame.
     """
     out_dir = Path(directory).expanduser() if directory else DEFAULT_DIR
     out_dir.mkdir(parents=True, exist_ok=True)
@@ -30,17 +125,31 @@ def capture_fullscreen(
     ts = time.strftime("%Y%m%d-%H%M%S")
     png_path = out_dir / f"{prefix}-{ts}.png"
 
-    im = pyautogui.screenshot()
-    im.save(png_path)
+    im = image if image is not None else _capturer.grab()
 
-    result = {"png_path": str(png_path)}
+    result: Dict[str, Any] = {"scale": 1.0}
+    write_png = keep_png or not compress
+    if write_png:
+        result["png_path"] = str(png_path)
 
     webp_path = None
     if compress:
-        webp_path, _, _ = compress_image(str(png_path), fmt="WEBP", max_width=max_width)
-        result["webp_path"] = webp_path
+        webp_path = out_dir / f"{prefix}-{ts}-compressed.webp"
+        if for_vlm:
+            max_width = min(max_width, VLM_MAX_WIDTH)
+        # Same sizing rule as _compress_pil, known before the encode finishes
+        w = im.size[0]
+        if max_width and w > max_width:
+            result["scale"] = w / float(max_width)
+        result["webp_path"] = str(webp_path)
         result["file_uri"] = f"file://{webp_path}"
     else:
         result["file_uri"] = f"file://{png_path}"
 
+    args = (result, im, png_path if write_png else None, webp_path, max_width, webp_method)
+    if background:
+        result["pending"] = _IO_POOL.submit(_encode, *args)
+    else:
+        _encode(*args)
+
     return result
@@ -3,30 +3,91 @@ import os
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
-from llama_cpp import Llama
+from llama_cpp import Llama, LlamaGrammar
+
+try:
+    import orjson  # optional: C JSON parser
+except Exception:  # pragma: no cover
+    orjson = None
+
+from real_time.prompt_cache import attach_prompt_cache
+
+
+# Kept byte-identical across calls so llama.cpp can reuse its KV prefix
+SYSTEM_PROMPT = (
+    "You analyze one or more desktop screenshots and return UI click targets as JSON. "
+    "If multiple images are provided, the first is the current frame and the rest are recent context frames, "
+    "unless the instruction says otherwise. "
+    "Output only JSON with fields: targets (list of {x:int, y:int, label:str, confidence:float}), and optional notes. "
+    "Coordinates must be absolute pixel positions for the current frame. "
+    "Map your reasoning to the actual pynput API used by the agent: mouse.position=(x,y) for absolute set; "
+    "mouse.move(dx,dy) for relative move; mouse.click(Button.left,count) for clicks; mouse.scroll(dx,dy) for scrolling. "
+    "Be conservative: if ambiguous or low confidence, return an empty list."
+)
+
+# Compact JSON rules: no whitespace, fixed key order, bounded integers and confidences in [0, 1]
+_TARGET_RULES = r"""
+target ::= "{\"x\":" int ",\"y\":" int ",\"label\":" str ",\"confidence\":" conf "}"
+targets ::= "[" (target ("," target)*)? "]"
+int    ::= "0" | [1-9] [0-9]? [0-9]? [0-9]? [0-9]?
+conf   ::= "0" ("." [0-9] [0-9]? [0-9]?)? | "1" (".0")?
+str    ::= "\"" ([^"\\\x7F\x00-\x1F] | "\\" ["\\/bfnrt])* "\""
+"""
+
+# Constrains suggest_targets output
+TARGETS_GRAMMAR = r"""
+root   ::= "{\"targets\":" targets (",\"notes\":" str)? "}"
+""" + _TARGET_RULES
+
+
+def _frames_grammar(n: int) -> str:
+    """Grammar for suggest_targets_multi: exactly one {"targets": [...]} entry per frame."""
+    frames = " ".join(['frame'] + ['"," frame'] * (n - 1))
+    return (
+        f'root   ::= "{{\\"frames\\":[" {frames} "]" (",\\"notes\\":" str)? "}}"\n'
+        'frame  ::= "{\\"targets\\":" targets "}"'
+    ) + _TARGET_RULES
+
+
+def _loads(content: str) -> Any:
+    return orjson.loads(content) if orjson is not None else json.loads(content)
 
 
 class VLMClient:
     """
     Vision-Language Model client using llama-cpp-python.
 
-    Loads a local GGUF multimodal model via from_pretrained and provides a helper to
-    infer click targets from a screenshot and instruction.
+    Loads a local GGUF multimodal model via from_pretrained and provides helpers to
+    infer click targets from one screenshot, or from several captures in a single request.
     """
 
     def __init__(
         self,
         repo_id: str = "gabriellarson/LFM2-VL-1.6B-GGUF",
-        filename: str = "LFM2-VL-1.6B-F16.gguf",
+        filename: str = "LFM2-VL-1.6B-Q4_K_M.gguf",
         n_ctx: int = 4096,
         n_threads: Optional[int] = None,
+        n_gpu_layers: Optional[int] = None,
+        n_batch: int = 512,
+        flash_attn: bool = True,
+        prompt_cache_bytes: int = 512 << 20,
     ) -> None:
+        """Quantization and GPU offload defaults follow LFMClient (Q4_K_M, DADOS_GPU_LAYERS)."""
+        if n_gpu_layers is None:
+            n_gpu_layers = int(os.environ.get("DADOS_GPU_LAYERS", "-1"))
         self.model = Llama.from_pretrained(
             repo_id=repo_id,
             filename=filename,
             n_ctx=n_ctx,
             n_threads=n_threads or os.cpu_count() or 4,
+            n_gpu_layers=n_gpu_layers,
+            n_batch=n_batch,
+            flash_attn=flash_attn,
         )
+        # Prefix KV cache, persisted across restarts, so the fixed prompts aren't re-prefilled
+        attach_prompt_cache(self.model, [SYSTEM_PROMPT], prompt_cache_bytes)
+        self._targets_grammar = LlamaGrammar.from_string(TARGETS_GRAMMAR, verbose=False)
+        self._frames_grammars: Dict[int, LlamaGrammar] = {}
 
     def suggest_targets(
         self,
@@ -41,34 +102,74 @@ class VLMClient:
         Ask the model for JSON: {"targets": [{"x": int, "y": int, "label": str, "confidence": float}], "notes": str}
         Coordinates are absolute pixels relative to the screenshot.
         """
-        p = Path(image_path).expanduser().resolve()
-        system_prompt = (
-            "You analyze one or more desktop screenshots and return UI click targets as JSON. "
-            "If multiple images are provided, the first is the current frame and the rest are recent context frames. "
-            "Output only JSON with fields: targets (list of {x:int, y:int, label:str, confidence:float}), and optional notes. "
-            "Coordinates must be absolute pixel positions for the current frame. "
-            "Map your reasoning to the actual pynput API used by the agent: mouse.position=(x,y) for absolute set; "
-            "mouse.move(dx,dy) for relative move; mouse.click(Button.left,count) for clicks; mouse.scroll(dx,dy) for scrolling. "
-            "Be conservative: if ambiguous or low confidence, return an empty list."
-        )
         user_text = (
             "Instruction: " + instruction + "\n" 
             "Return JSON with fields: targets (list of {x, y, label, confidence}), and optional notes."
         )
-        # Build message content with current image plus optional context images
-        content_parts: List[Dict[str, Any]] = [
-            {"type": "text", "text": user_text},
-            {"type": "image_url", "image_url": {"url": f"file://{p}"}},
-        ]
-        if context_images:
-            for ci in context_images:
-                try:
-                    cp = Path(ci).expanduser().resolve()
-                    content_parts.append({"type": "image_url", "image_url": {"url": f"file://{cp}"}})
-                except Exception:
-                    continue
+        parsed = self._complete(
+            [image_path], context_images, user_text, self._targets_grammar,
+            temperature, top_p, max_tokens,
+        )
+        return parsed if parsed is not None else {"targets": [], "notes": "parse_error"}
+
+    def suggest_targets_multi(
+        self,
+        frames: List[str],
+        instruction: str,
+        context_images: Optional[List[str]] = None,
+        temperature: float = 0.1,
+        top_p: float = 0.9,
+        max_tokens: int = 768,
+    ) -> Dict[str, Any]:
+        """
+        Analyze several captures of the screen (oldest first) in one request, so the chat
+        prefill and prompt overhead are paid once instead of once per frame.
+        Returns {"frames": [{"targets": [...]}, ...], "notes": str} with one entry per frame,
+        in order; coordinates in each entry are pixels of that frame.
+        """
+        n = len(frames)
+        grammar = self._frames_grammars.get(n)
+        if grammar is None:
+            grammar = LlamaGrammar.from_string(_frames_grammar(n), verbose=False)
+            self._frames_grammars[n] = grammar
+        user_text = (
+            "Instruction: " + instruction + "\n"
+            f"The first {n} images are consecutive captures of the current screen, oldest first; "
+            "any further images are older context frames.\n"
+            "Return JSON with fields: frames (one {targets: list of {x, y, label, confidence}} per capture, "
+            "in the same order), and optional notes."
+        )
+        parsed = self._complete(
+            frames, context_images, user_text, grammar,
+            temperature, top_p, max_tokens,
+        )
+        if parsed is None:
+            return {"frames": [{"targets": []} for _ in frames], "notes": "parse_error"}
+        return parsed
+
+    def _complete(
+        self,
+        frames: List[str],
+        context_images: Optional[List[str]],
+        user_text: str,
+        grammar: LlamaGrammar,
+        temperature: float,
+        top_p: float,
+        max_tokens: int,
+    ) -> Optional[Dict[str, Any]]:
+        content_parts: List[Dict[str, Any]] = [{"type": "text", "text": user_text}]
+        for img in frames:
+            p = Path(img).expanduser().resolve()
+            content_parts.append({"type": "image_url", "image_url": {"url": f"file://{p}"}})
+        # Context frames are best-effort
+        for ci in context_images or []:
+            try:
+                cp = Path(ci).expanduser().resolve()
+                content_parts.append({"type": "image_url", "image_url": {"url": f"file://{cp}"}})
+            except Exception:
+                continue
         messages = [
-            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": content_parts},
         ]
         resp = self.model.create_chat_completion(
@@ -76,17 +177,11 @@ class VLMClient:
             temperature=temperature,
             top_p=top_p,
             max_tokens=max_tokens,
+            grammar=grammar,
         )
         content = resp["choices"][0]["message"]["content"].strip()
+        # The grammar guarantees the shape; this only fails if max_tokens cut the object short
         try:
-            return json.loads(content)
+            return _loads(content)
         except Exception:
-            # Fallback: try to extract JSON object substring
-            start = content.find("{")
-            end = content.rfind("}")
-            if start != -1 and end != -1 and end > start:
-                try:
-                    return json.loads(content[start:end + 1])
-                except Exception:
-                    pass
-        return {"targets": [], "notes": "parse_error"}
+            return None
@@ -0,0 +1,48 @@
+"""
+Bounded single-producer / single-consumer ring for handing audio to the worker
+"""
+
+import threading
+
+
+class SPSCRing:
+    """
+    Fixed-size ring with one producer (key listener) and one consumer (worker).
+    Each side only advances its own index, so put/get never take a mutex on the
+    data path; an Event wakes the consumer when it has drained the ring.
+    """
+
+    def __init__(self, capacity=8):
+        self.capacity = capacity
+        self._slots = [None] * capacity
+        self._head = 0  # next slot to read; advanced only by the consumer
+        self._tail = 0  # next slot to write; advanced only by the producer
+        self._ready = threading.Event()
+
+    def put(self, item):
+        """Enqueue item; returns False without blocking if the ring is full"""
+        if self._tail - self._head >= self.capacity:
+            return False
+        self._slots[self._tail % self.capacity] = item
+        self._tail += 1  # publish only after the slot is written
+        self._ready.set()
+        return True
+
+    def get(self, timeout=None):
+        """Dequeue the oldest item, waiting until one is available (None on timeout)"""
+        while True:
+            if self._head < self._tail:
+                idx = self._head % self.capacity
+                item = self._slots[idx]
+                self._slots[idx] = None
+                self._head += 1
+                return item
+            self._ready.clear()
+            # Re-check after clearing so a put between the check and clear isn't missed
+            if self._head < self._tail:
+                continue
+            if not self._ready.wait(timeout):
+                return None
+
+    def __len__(self):
+        return self._tail - self._head
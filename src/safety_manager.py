@@ -28,21 +28,24 @@ class SafetyManager:
             'format c:',
         }
 
+        # All patterns fused into one precompiled alternation: a single scan per command
+        self._danger_re = re.compile(
+            "|".join(f"(?:{p})" for p in self.dangerous_patterns), re.IGNORECASE
+        )
+        # Substrings at least one of which every pattern and blocked command contains;
+        # keep in sync with the lists above. Benign commands fail all of them and skip the regex.
+        self._danger_hints = ("rm", "kill", "shutdown", "reboot", "dd", "mkfs", "format")
+
+    def _is_dangerous(self, cmd_str: str) -> bool:
+        """cmd_str is the lowercased, space-joined command"""
+        if not any(h in cmd_str for h in self._danger_hints):
+            return False
+        return cmd_str in self.blocked_commands or self._danger_re.search(cmd_str) is not None
+
     def requires_confirmation(self, commands: List[List[str]]) -> bool:
         """Check if any command requires user confirmation"""
-        for cmd in commands:
-            cmd_str = ' '.join(cmd).lower()
-            
-            # Check blocked commands
-            if cmd_str in self.blocked_commands:
-                return True
-                
-            # Check dangerous patterns
-            for pattern in self.dangerous_patterns:
-                if re.search(pattern, cmd_str, re.IGNORECASE):
-                    return True
-                    
-        return False
+        # Check blocked commands and dangerous patterns
+        return any(self._is_dangerous(' '.join(cmd).lower()) for cmd in commands)
 
     def get_confirmation_prompt(self, commands: List[List[str]]) -> str:
         """Generate confirmation prompt for dangerous commands"""
@@ -60,10 +63,6 @@ Type 'yes' to confirm, or anything else to cancel: """
         """Remove obviously dangerous commands"""
         safe_commands = []
         for cmd in commands:
-            cmd_str = ' '.join(cmd).lower()
-            if cmd_str not in self.blocked_commands:
-                is_dangerous = any(re.search(pattern, cmd_str, re.IGNORECASE) 
-                                 for pattern in self.dangerous_patterns)
-                if not is_dangerous:
-                    safe_commands.append(cmd)
+            if not self._is_dangerous(' '.join(cmd).lower()):
+                safe_commands.append(cmd)
         return safe_commands
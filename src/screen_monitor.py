@@ -2,22 +2,76 @@
 Continuous screen monitoring system that takes screenshots every second
 to track screen state changes and cursor position verification.
 """
+import queue
 import threading
 import time
 import os
+from collections import deque
+from itertools import islice
+from operator import itemgetter
 from datetime import datetime
-from real_time.screenshot import capture_fullscreen
+from console_log import get_logger
+from real_time.screenshot import capture_fullscreen, grab_screen
+
+log = get_logger("screen_monitor")
+
+
+def _unlink_all(directory, names):
+    """Delete files in directory by name, ignoring ones that are already gone, and
+    return the names that could not be deleted.
+    The directory is opened once and each unlink is relative to that fd (unlinkat),
+    so the kernel doesn't walk the directory path again per file."""
+    if not names:
+        return []
+    if not hasattr(os, "O_DIRECTORY") or os.unlink not in os.supports_dir_fd:
+        return [name for name in names if not _unlink_one(os.path.join(directory, name))]
+
+    dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY | getattr(os, "O_CLOEXEC", 0))
+    try:
+        return [name for name in names if not _unlink_one(name, dir_fd)]
+    finally:
+        os.close(dir_fd)
+
+
+def _unlink_one(path, dir_fd=None):
+    """True once path is gone (including when it already was)"""
+    try:
+        os.unlink(path, dir_fd=dir_fd)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        log.error(f"❌ Could not delete {path}: {e}")
+        return False
+    return True
 
 class ScreenMonitor:
-    def __init__(self, interval=1.0, data_dir="data/screenshots"):
+    def __init__(self, interval=1.0, data_dir="data/screenshots", keep_last_n=100):
         self.interval = interval
         self.data_dir = data_dir
+        self.keep_last_n = keep_last_n
         self.running = False
         self.thread = None
+        self.encoder_thread = None
         self.screenshot_count = 0
+        self._frame_seq = 0
+        # Grabbed frames waiting to be encoded; when the disk falls behind the oldest
+        # frame is dropped so the grab loop keeps its interval
+        self._raw_q = queue.Queue(maxsize=2)
+        # (pixel hash, path) of recent distinct frames, newest last; a static screen
+        # yields identical pixels, so consecutive duplicates are not recorded
+        self._recent = deque(maxlen=8)
+        self._recent_lock = threading.Lock()
         
         # Ensure screenshot directory exists
         os.makedirs(data_dir, exist_ok=True)
+
+        # Paths of every monitoring screenshot on disk, oldest first. Seeded once from
+        # the directory, then maintained by _monitor_loop and cleanup_old_screenshots,
+        # so lookups never rescan the directory
+        entries = self._scan_monitor_files()
+        entries.sort(key=itemgetter(1))
+        self._paths = deque(path for path, _ in entries)
+        self._paths_lock = threading.Lock()
         
     def start(self):
         """Start continuous screenshot monitoring"""
@@ -25,63 +79,119 @@ class ScreenMonitor:
             return
             
         self.running = True
+        self.encoder_thread = threading.Thread(target=self._encode_loop, daemon=True)
+        self.encoder_thread.start()
         self.thread = threading.Thread(target=self._monitor_loop, daemon=True)
         self.thread.start()
-        print(f"📸 Screen monitoring started (every {self.interval}s)")
+        log.info(f"📸 Screen monitoring started (every {self.interval}s)")
         
     def stop(self):
         """Stop continuous screenshot monitoring"""
         self.running = False
         if self.thread:
             self.thread.join(timeout=2)
-        print("📸 Screen monitoring stopped")
+        if self.encoder_thread:
+            self.encoder_thread.join(timeout=2)
+        log.info("📸 Screen monitoring stopped")
         
     def _monitor_loop(self):
-        """Main monitoring loop that captures screenshots continuously"""
+        """Main monitoring loop: grabs frames and hands them to _encode_loop"""
+        # Fixed cadence on monotonic deadlines, so grab time doesn't stretch the period
+        next_t = time.monotonic()
         while self.running:
             try:
                 timestamp = datetime.now().strftime("%H%M%S")
-                prefix = f"monitor_{timestamp}_{self.screenshot_count:04d}"
+                prefix = f"monitor_{timestamp}_{self._frame_seq:04d}"
+                self._frame_seq += 1
+                item = (prefix, grab_screen())
+                try:
+                    self._raw_q.put_nowait(item)
+                except queue.Full:
+                    try:
+                        self._raw_q.get_nowait()
+                    except queue.Empty:
+                        pass
+                    self._raw_q.put_nowait(item)
+            except Exception as e:
+                log.error(f"❌ Screenshot monitoring error: {e}")
                 
-                # Capture screenshot
-                capture_result = capture_fullscreen(prefix=prefix)
+            next_t += self.interval
+            now = time.monotonic()
+            if now < next_t:
+                time.sleep(next_t - now)
+            else:
+                # Overran the slot: drop the missed ticks instead of bursting to catch up
+                next_t = now
+
+    def _encode_loop(self):
+        """Encodes and writes grabbed frames until stopped and drained"""
+        while self.running or not self._raw_q.empty():
+            try:
+                prefix, image = self._raw_q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                # Only ever used as VLM context, so at VLM resolution; encoded every
+                # tick, so at the fastest WEBP effort
+                capture_result = capture_fullscreen(
+                    directory=self.data_dir, prefix=prefix, for_vlm=True, image=image, webp_method=0
+                )
                 
                 if capture_result:
+                    path = capture_result.get("webp_path") or capture_result.get("png_path")
+                    with self._paths_lock:
+                        self._paths.append(path)
+                    self._remember(path, capture_result["hash"])
                     self.screenshot_count += 1
                     # Optional: Log screenshot info
                     if self.screenshot_count % 10 == 0:  # Every 10 screenshots
-                        print(f"📸 Captured {self.screenshot_count} monitoring screenshots")
+                        log.info(f"📸 Captured {self.screenshot_count} monitoring screenshots")
+                        # Prune in batches rather than one unlink per frame
+                        self.cleanup_old_screenshots(self.keep_last_n)
                 
             except Exception as e:
-                print(f"❌ Screenshot monitoring error: {e}")
-                
-            time.sleep(self.interval)
+                log.error(f"❌ Screenshot monitoring error: {e}")
             
+    def _scan_monitor_files(self):
+        """(path, mtime) for every monitoring screenshot already in data_dir"""
+        with os.scandir(self.data_dir) as it:
+            return [(e.path, e.stat().st_mtime) for e in it if e.name.startswith("monitor_")]
+
     def get_latest_screenshot(self):
         """Get the path to the most recent screenshot"""
-        try:
-            files = [f for f in os.listdir(self.data_dir) if f.startswith("monitor_")]
-            if not files:
-                return None
-                
-            # Sort by modification time, get newest
-            files.sort(key=lambda x: os.path.getmtime(os.path.join(self.data_dir, x)), reverse=True)
-            return os.path.join(self.data_dir, files[0])
-        except:
-            return None
+        with self._paths_lock:
+            return self._paths[-1] if self._paths else None
     
     def get_recent_images(self, n: int = 3):
         """Return up to N most recent monitoring screenshot file paths (PNG or WEBP)."""
-        try:
-            files = [f for f in os.listdir(self.data_dir) if f.startswith("monitor_")]
-            if not files:
-                return []
-            # Sort newest first
-            files.sort(key=lambda x: os.path.getmtime(os.path.join(self.data_dir, x)), reverse=True)
-            paths = [os.path.join(self.data_dir, f) for f in files[:max(0, n)]]
-            return paths
-        except Exception:
-            return []
+        with self._paths_lock:
+            return list(islice(reversed(self._paths), max(0, n)))
+            
+    def _remember(self, path, h):
+        """Record a new frame unless its pixels match the previous one"""
+        if not path:
+            return
+        with self._recent_lock:
+            if self._recent and self._recent[-1][0] == h:
+                return
+            self._recent.append((h, path))
+
+    def get_recent_unique_images(self, n: int = 3, exclude_hashes=()):
+        """Return up to N most recent distinct frames, newest first, skipping any whose
+        pixel hash (image_hash) is in exclude_hashes (e.g. the frame the VLM is already analyzing)."""
+        exclude = set(exclude_hashes)
+        with self._recent_lock:
+            recent = list(self._recent)
+        paths = []
+        seen = set()
+        for h, path in reversed(recent):
+            if len(paths) >= n:
+                break
+            if h in exclude or h in seen or not os.path.exists(path):
+                continue
+            seen.add(h)
+            paths.append(path)
+        return paths
             
     def verify_cursor_position(self, expected_x, expected_y, tolerance=10):
         """
@@ -101,18 +211,26 @@ class ScreenMonitor:
     def cleanup_old_screenshots(self, keep_last_n=100):
         """Clean up old monitoring screenshots, keeping only the most recent N"""
         try:
-            files = [f for f in os.listdir(self.data_dir) if f.startswith("monitor_")]
-            if len(files) <= keep_last_n:
-                return
+            with self._paths_lock:
+                if len(self._paths) <= keep_last_n:
+                    return
+                # Oldest files are at the left
+                to_delete = [self._paths.popleft() for _ in range(len(self._paths) - keep_last_n)]
                 
-            # Sort by modification time
-            files.sort(key=lambda x: os.path.getmtime(os.path.join(self.data_dir, x)))
-            
-            # Delete oldest files
-            to_delete = files[:-keep_last_n]
-            for file in to_delete:
-                os.remove(os.path.join(self.data_dir, file))
+            # Every tracked path lives directly in data_dir
+            names = [os.path.basename(p) for p in to_delete]
+            try:
+                failed = set(_unlink_all(self.data_dir, names))
+            except OSError as e:
+                log.error(f"❌ Cleanup error: {e}")
+                failed = set(names)
+            if failed:
+                # Keep tracking what is still on disk so the next cleanup retries it
+                with self._paths_lock:
+                    self._paths.extendleft(reversed(
+                        [p for p in to_delete if os.path.basename(p) in failed]
+                    ))
                 
-            print(f"🧹 Cleaned up {len(to_delete)} old monitoring screenshots")
+            log.info(f"🧹 Cleaned up {len(to_delete) - len(failed)} old monitoring screenshots")
         except Exception as e:
-            print(f"❌ Cleanup error: {e}")
+            log.error(f"❌ Cleanup error: {e}")
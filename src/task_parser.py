@@ -4,8 +4,9 @@ Handles "AND", "then", "while" connectors per system.md requirements.
 """
 from __future__ import annotations
 
+import functools
 import re
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 from dataclasses import dataclass
 from enum import Enum
 
@@ -17,6 +18,9 @@ class TaskType(Enum):
 
 @dataclass
 class Task:
+    # Declared by hand (not dataclass(slots=True)) to stay importable before Python 3.10
+    __slots__ = ("id", "instruction", "task_type", "depends_on")
+
     id: str
     instruction: str
     task_type: TaskType
@@ -24,7 +28,7 @@ class Task:
 
 
 class TaskParser:
-    def __init__(self) -> None:
+    def __init__(self, cache_size: int = 512) -> None:
         # Patterns for splitting complex instructions
         self.parallel_connectors = [
             r'\band\b',
@@ -43,19 +47,34 @@ class TaskParser:
             r'\bfollowed by\b',
         ]
 
+        # Every connector in one precompiled alternation: a single scan per instruction.
+        # Group names p<i>/s<i> tell parallel from sequential matches
+        self._connector_re = re.compile(
+            "|".join(
+                [f"(?P<p{i}>{p})" for i, p in enumerate(self.parallel_connectors)]
+                + [f"(?P<s{i}>{p})" for i, p in enumerate(self.sequential_connectors)]
+            ),
+            re.IGNORECASE,
+        )
+
+        # Parsing is a pure function of the text, and users repeat instructions often
+        self._parse_cached = functools.lru_cache(maxsize=cache_size)(self._parse)
+
     def parse(self, instruction: str) -> List[Task]:
-        """Parse instruction into tasks with dependencies"""
+        """Parse instruction into tasks with dependencies.
+        Repeated instructions share cached Task objects; treat them as read-only."""
         # Clean up instruction
-        text = instruction.strip()
-        
+        return list(self._parse_cached(instruction.strip()))
+
+    def _parse(self, text: str) -> Tuple[Task, ...]:
         # Check if it's a complex multi-task instruction
         if not self._is_multi_task(text):
-            return [Task(
+            return (Task(
                 id="task_0",
                 instruction=text,
                 task_type=TaskType.PARALLEL,
                 depends_on=[]
-            )]
+            ),)
         
         # Split into segments based on connectors
         segments = self._split_instruction(text)
@@ -80,50 +99,34 @@ class TaskParser:
                 depends_on=depends_on
             ))
         
-        return tasks
+        return tuple(tasks)
 
     def _is_multi_task(self, text: str) -> bool:
         """Check if instruction contains multiple tasks"""
-        all_connectors = self.parallel_connectors + self.sequential_connectors
-        return any(re.search(pattern, text, re.IGNORECASE) for pattern in all_connectors)
+        return self._connector_re.search(text) is not None
 
     def _split_instruction(self, text: str) -> List[tuple[str, TaskType]]:
         """Split instruction into segments with their connector types"""
         segments = []
-        remaining = text
-        
-        # Find all connectors and their positions
-        connectors_found = []
-        
-        for pattern in self.parallel_connectors:
-            for match in re.finditer(pattern, remaining, re.IGNORECASE):
-                connectors_found.append((match.start(), match.end(), TaskType.PARALLEL, match.group()))
-        
-        for pattern in self.sequential_connectors:
-            for match in re.finditer(pattern, remaining, re.IGNORECASE):
-                connectors_found.append((match.start(), match.end(), TaskType.SEQUENTIAL, match.group()))
+        last_end = 0
+        last_type = None
         
-        # Sort by position
-        connectors_found.sort(key=lambda x: x[0])
+        # Connectors come back left to right and non-overlapping, so no sort is needed
+        for match in self._connector_re.finditer(text):
+            task_type = TaskType.SEQUENTIAL if match.lastgroup[0] == "s" else TaskType.PARALLEL
+            # Add segment before connector
+            segment = text[last_end:match.start()].strip()
+            if segment:
+                segments.append((segment, TaskType.PARALLEL if not segments else task_type))
+            last_end = match.end()
+            last_type = task_type
         
-        if not connectors_found:
+        if last_type is None:
             return [(text, TaskType.PARALLEL)]
         
-        # Split text at connector positions
-        last_end = 0
-        for start, end, task_type, connector in connectors_found:
-            # Add segment before connector
-            if start > last_end:
-                segment = remaining[last_end:start].strip()
-                if segment:
-                    segments.append((segment, TaskType.PARALLEL if not segments else task_type))
-            last_end = end
-        
         # Add final segment
-        if last_end < len(remaining):
-            final_segment = remaining[last_end:].strip()
-            if final_segment:
-                final_type = connectors_found[-1][2] if connectors_found else TaskType.PARALLEL
-                segments.append((final_segment, final_type))
+        final_segment = text[last_end:].strip()
+        if final_segment:
+            segments.append((final_segment, last_type))
         
         return segments if segments else [(text, TaskType.PARALLEL)]
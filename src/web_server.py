@@ -2,27 +2,73 @@
 Web server for Dados UI - serves the web interface and provides real-time data via WebSocket
 """
 import asyncio
+import functools
+import itertools
 import json
+import mimetypes
 import os
 import time
+from collections import deque
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Deque, Dict, List, Optional, Set, Tuple
 
 import websockets
 from websockets.server import WebSocketServerProtocol
-from http.server import HTTPServer, SimpleHTTPRequestHandler
 import threading
-from urllib.parse import urlparse
+from urllib.parse import unquote, urlparse
+
+from console_log import get_logger
+
+try:
+    import orjson  # optional: C JSON serializer
+except Exception:  # pragma: no cover
+    orjson = None
+
+log = get_logger("web_server")
+
+# The UI (index.html, script.js, assets/) lives in the project root
+STATIC_ROOT = Path(__file__).resolve().parent.parent
+
+_HTTP_REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found",
+    405: "Method Not Allowed", 431: "Request Header Fields Too Large",
+}
+# A client gets this long to send its request line and headers, in at most this many bytes
+_HTTP_READ_TIMEOUT = 10.0
+_HTTP_MAX_HEAD = 16 * 1024
+# Screenshots are WEBP; older Pythons' mimetypes table lacks it
+mimetypes.add_type("image/webp", ".webp")
+
+
+def _dumps(obj) -> str:
+    # Text, not bytes: websockets sends bytes as a binary frame, which the UI can't JSON.parse
+    return orjson.dumps(obj).decode("utf-8") if orjson is not None else json.dumps(obj)
+
 
 class DadosWebServer:
-    def __init__(self, host="localhost", http_port=8080, ws_port=8081):
+    def __init__(self, host="localhost", http_port=8080, ws_port=8081, static_root=STATIC_ROOT,
+                 batch_window: float = 0.05):
         self.host = host
         self.http_port = http_port
         self.ws_port = ws_port
-        self.clients: List[WebSocketServerProtocol] = []
-        self.speech_history: List[Dict] = []
-        self.action_history: List[Dict] = []
+        self.static_root = Path(static_root).resolve()
+        self.clients: Set[WebSocketServerProtocol] = set()
         self.max_history = 50
+        # Most recent first; appendleft trims the oldest entry automatically
+        self.speech_history: Deque[Dict] = deque(maxlen=self.max_history)
+        self.action_history: Deque[Dict] = deque(maxlen=self.max_history)
+        # Bumped after every history write; the serialized init message is reused
+        # for new connections until the version moves on
+        self._version_counter = itertools.count(1)
+        self._history_version = 0
+        self._init_message: Optional[Tuple[int, str]] = None
+        # Event loop serving the WebSocket clients, set once the servers are up
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Updates arriving within batch_window seconds go out as one message;
+        # only touched on the loop thread
+        self.batch_window = batch_window
+        self._pending: List[Dict] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
         
     def add_speech_entry(self, text: str, timestamp: Optional[str] = None):
         """Add a speech input entry"""
@@ -35,16 +81,9 @@ class DadosWebServer:
             "type": "speech"
         }
         
-        self.speech_history.insert(0, entry)  # Most recent first
-        if len(self.speech_history) > self.max_history:
-            self.speech_history = self.speech_history[:self.max_history]
-            
-        # Broadcast to all connected clients (only if event loop is running)
-        try:
-            asyncio.create_task(self._broadcast_update("speech", entry))
-        except RuntimeError:
-            # No event loop running yet, skip broadcast
-            pass
+        self.speech_history.appendleft(entry)
+        self._history_version = next(self._version_counter)
+        self._schedule_broadcast("speech", entry)
     
     def add_action_entry(self, action_type: str, details: str, success: bool = True, timestamp: Optional[str] = None):
         """Add an action log entry"""
@@ -59,52 +98,58 @@ class DadosWebServer:
             "type": "action"
         }
         
-        self.action_history.insert(0, entry)  # Most recent first
-        if len(self.action_history) > self.max_history:
-            self.action_history = self.action_history[:self.max_history]
-            
-        # Broadcast to all connected clients (only if event loop is running)
-        try:
-            asyncio.create_task(self._broadcast_update("action", entry))
-        except RuntimeError:
-            # No event loop running yet, skip broadcast
-            pass
+        self.action_history.appendleft(entry)
+        self._history_version = next(self._version_counter)
+        self._schedule_broadcast("action", entry)
     
-    async def _broadcast_update(self, update_type: str, data: Dict):
-        """Broadcast update to all connected WebSocket clients"""
-        if not self.clients:
+    def _schedule_broadcast(self, update_type: str, data: Dict):
+        """Broadcast from any thread; a no-op until the server loop is running"""
+        loop = self._loop
+        if loop is not None and loop.is_running():
+            loop.call_soon_threadsafe(self._queue_update, {"type": update_type, "data": data})
+
+    def _queue_update(self, update: Dict):
+        self._pending.append(update)
+        if self._flush_handle is None:
+            self._flush_handle = self._loop.call_later(self.batch_window, self._flush)
+
+    def _flush(self):
+        """Send the updates queued during the batch window, as one message"""
+        pending, self._pending = self._pending, []
+        self._flush_handle = None
+        if not pending or not self.clients:
             return
-            
-        message = json.dumps({
-            "type": update_type,
-            "data": data
-        })
-        
-        # Send to all clients, remove disconnected ones
-        disconnected = []
-        for client in self.clients:
-            try:
-                await client.send(message)
-            except websockets.exceptions.ConnectionClosed:
-                disconnected.append(client)
-        
-        for client in disconnected:
-            self.clients.remove(client)
+        payload = pending[0] if len(pending) == 1 else {"type": "batch", "events": pending}
+        # Serialized once; broadcast() queues the frame on every open connection without
+        # awaiting any of them, and skips connections that are closing or closed
+        websockets.broadcast(self.clients, _dumps(payload))
     
+    def _init_payload(self) -> str:
+        """Serialized init message, rebuilt only after the histories change"""
+        cached = self._init_message
+        version = self._history_version
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        # Tagged with the version read before serializing, so a write that lands
+        # meanwhile makes the next connection rebuild rather than reuse stale data
+        message = _dumps({
+            "type": "init",
+            "data": {
+                "speech_history": list(self.speech_history),
+                "action_history": list(self.action_history)
+            }
+        })
+        self._init_message = (version, message)
+        return message
+
     async def handle_websocket(self, websocket: WebSocketServerProtocol):
         """Handle WebSocket connections"""
-        self.clients.append(websocket)
-        print(f"WebSocket client connected: {websocket.remote_address}")
+        self.clients.add(websocket)
+        log.info(f"WebSocket client connected: {websocket.remote_address}")
         
         try:
             # Send initial data
-            await websocket.send(json.dumps({
-                "type": "init",
-                "data": {
-                    "speech_history": self.speech_history,
-                    "action_history": self.action_history
-                }
-            }))
+            await websocket.send(self._init_payload())
             
             # Keep connection alive
             async for message in websocket:
@@ -114,59 +159,120 @@ class DadosWebServer:
         except websockets.exceptions.ConnectionClosed:
             pass
         finally:
-            if websocket in self.clients:
-                self.clients.remove(websocket)
-            print(f"WebSocket client disconnected: {websocket.remote_address}")
+            self.clients.discard(websocket)
+            log.info(f"WebSocket client disconnected: {websocket.remote_address}")
     
-    def start_websocket_server(self):
-        """Start WebSocket server in background thread"""
-        def run_ws():
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-            async def start_server():
-                server = await websockets.serve(
-                    self.handle_websocket,
-                    self.host,
-                    self.ws_port
+    def _resolve_static(self, url_path: str) -> Optional[Path]:
+        """Map a URL path to a file under static_root; None if missing or outside it"""
+        try:
+            path = (self.static_root / unquote(url_path).lstrip("/")).resolve()
+        except (ValueError, OSError):
+            # e.g. an embedded NUL from %00
+            return None
+        if path != self.static_root and self.static_root not in path.parents:
+            return None
+        if path.is_dir():
+            path = path / "index.html"
+        return path if path.is_file() else None
+
+    async def _send_http_head(self, writer: asyncio.StreamWriter, status: int,
+                              content_type: str = "text/plain", length: int = 0) -> None:
+        writer.write((
+            f"HTTP/1.0 {status} {_HTTP_REASONS[status]}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {length}\r\n"
+            "Access-Control-Allow-Origin: *\r\n"
+            "Access-Control-Allow-Methods: GET, HEAD, OPTIONS\r\n"
+            "Access-Control-Allow-Headers: Content-Type\r\n"
+            "Connection: close\r\n\r\n"
+        ).encode("latin-1"))
+        await writer.drain()
+
+    @staticmethod
+    async def _read_request_line(reader: asyncio.StreamReader) -> bytes:
+        """Request line, after reading past the headers (which are not needed).
+        Raises ValueError once the request head exceeds _HTTP_MAX_HEAD."""
+        request_line = await reader.readline()
+        if not request_line.strip():
+            # Blank or EOF: no head follows to read past; the caller answers 400
+            return request_line
+        total = len(request_line)
+        while True:
+            line = await reader.readline()
+            total += len(line)
+            if total > _HTTP_MAX_HEAD:
+                raise ValueError("request head too large")
+            if line in (b"\r\n", b"\n", b""):
+                return request_line
+
+    async def handle_http(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve one static file request (GET/HEAD, plus CORS preflight), one request per connection"""
+        try:
+            try:
+                request_line = await asyncio.wait_for(
+                    self._read_request_line(reader), _HTTP_READ_TIMEOUT
                 )
-                print(f"WebSocket server started on ws://{self.host}:{self.ws_port}")
-                await server.wait_closed()
-            
-            loop.run_until_complete(start_server())
-        
-        ws_thread = threading.Thread(target=run_ws, daemon=True)
-        ws_thread.start()
-    
-    def start_http_server(self):
-        """Start HTTP server to serve static files"""
-        class DadosHTTPHandler(SimpleHTTPRequestHandler):
-            def __init__(self, *args, **kwargs):
-                # Serve from the project root directory
-                super().__init__(*args, directory=str(Path(__file__).parent.parent), **kwargs)
-            
-            def end_headers(self):
-                # Add CORS headers
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-                self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-                super().end_headers()
-        
-        def run_http():
-            server = HTTPServer((self.host, self.http_port), DadosHTTPHandler)
-            print(f"HTTP server started on http://{self.host}:{self.http_port}")
-            server.serve_forever()
-        
-        http_thread = threading.Thread(target=run_http, daemon=True)
-        http_thread.start()
-    
+            except asyncio.TimeoutError:
+                return
+            except ValueError:
+                # Head over the limit, or a single line over the stream limit
+                await self._send_http_head(writer, 431)
+                return
+            parts = request_line.decode("latin-1").split()
+            if len(parts) < 2:
+                await self._send_http_head(writer, 400)
+                return
+            method, target = parts[0], parts[1]
+            if method == "OPTIONS":
+                # CORS preflight: the allow headers are on every response
+                await self._send_http_head(writer, 200)
+                return
+            if method not in ("GET", "HEAD"):
+                await self._send_http_head(writer, 405)
+                return
+
+            path = self._resolve_static(urlparse(target).path)
+            if path is None:
+                await self._send_http_head(writer, 404)
+                return
+            content_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+            with open(path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                await self._send_http_head(writer, 200, content_type, size)
+                if method == "GET":
+                    # sendfile(2) where the transport supports it, so file bytes skip Python.
+                    # Bounded to the advertised length in case the file grows meanwhile
+                    await asyncio.get_running_loop().sendfile(writer.transport, f, 0, size)
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            writer.close()
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        http_server = await asyncio.start_server(
+            self.handle_http, self.host, self.http_port, limit=_HTTP_MAX_HEAD
+        )
+        log.info(f"HTTP server started on http://{self.host}:{self.http_port}")
+        ws_server = await websockets.serve(self.handle_websocket, self.host, self.ws_port)
+        log.info(f"WebSocket server started on ws://{self.host}:{self.ws_port}")
+        await asyncio.gather(http_server.serve_forever(), ws_server.wait_closed())
+
     def start(self):
-        """Start both HTTP and WebSocket servers"""
-        self.start_http_server()
-        self.start_websocket_server()
+        """Start the HTTP and WebSocket servers on one event loop in a background thread"""
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(self._serve())
+
+        server_thread = threading.Thread(target=run, daemon=True)
+        server_thread.start()
         
         # Add initial system message
         self.add_action_entry("System", "Web server started → Ready for connections", True)
 
-# Global instance for easy access from main.py
-web_server = DadosWebServer()
+@functools.lru_cache(maxsize=1)
+def get_web_server() -> DadosWebServer:
+    """Process-wide server instance, created on first use rather than at import.
+    Construction starts nothing; call start() to bring the servers up."""
+    return DadosWebServer()